@@ -1,15 +1,43 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, Query
+from starlette.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from datetime import date, timedelta, datetime
+from fastapi.responses import StreamingResponse, JSONResponse
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+import os
+import time
 import db_helper
+import async_db_helper
+import ingest
+import export
+from fast_json import FastJSONResponse
+from compression import CompressionMiddleware
+import cache
+import metrics
+import tracing
+import analytics
+import columnar_analytics
+from password_hashing import HashingBusyError
 from typing import List, Optional
 from pydantic import BaseModel
 import mysql.connector
-from jose import jwt, JWTError
+from tokens import create_access_token, verify_token, InvalidTokenError, token_cache
 
-SECRET_KEY = "super_secret_key"  # put in .env
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+INGEST_BATCH_ROWS = int(os.getenv('INGEST_BATCH_ROWS', 5000))
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_DAYS = 366
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1000))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+
+# Per-user read cache; every write path for a user must call read_cache.invalidate_user()
+read_cache = cache.create_cache(
+    os.getenv('CACHE_BACKEND', 'memory'),
+    maxsize=int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+    ttl=float(os.getenv('CACHE_TTL_SECONDS', 300)),
+    url=os.getenv('CACHE_REDIS_URL')
+)
 
 
 class UserCreate(BaseModel):
@@ -28,25 +56,86 @@ class DateRange(BaseModel):
     end_date: date
 
 
-def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = verify_token(token)
         return payload  # contains "sub" (username) and "id" (user_id)
-    except JWTError:
+    except InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await async_db_helper.init_pool()
+    # Compute the dummy hash used for unknown usernames before the first login needs it
+    await run_in_threadpool(db_helper.dummy_hash)
+    yield
+    await async_db_helper.close_pool()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_level=GZIP_LEVEL)
+# Added after compression, so it wraps it and request latency includes compression time
+app.add_middleware(metrics.MetricsMiddleware)
+if tracing.configure("expense-api") is not None:
+    # Only installed with TRACING_ENABLED=true; spans continue the caller's traceparent
+    app.add_middleware(tracing.TracingMiddleware)
+metrics.register_stats(metrics.StatsCollector(
+    pool_stats=db_helper.get_pool_stats,
+    hasher_stats=db_helper.hasher.stats,
+    caches={"read": read_cache.stats, "token": token_cache.stats, "unknown_user": db_helper.unknown_users.stats}
+))
+
+
+@app.exception_handler(HashingBusyError)
+async def hashing_busy_handler(request: Request, exc: HashingBusyError):
+    # Shed login/sign-up load instead of queueing bcrypt work behind everyone else
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many login attempts in progress, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
+
+
+async def not_modified(request: Request, response: Response, user_id: int):
+    """Set ETag/Last-Modified from the user's data version; a 304 response if the client's copy is current.
+
+    Handlers call this before touching the cache or MySQL, so an unchanged resource costs
+    one version lookup. Every write path bumps the version through read_cache.invalidate_user().
+    """
+    version = await read_cache.adata_version(user_id)
+    if version is None:
+        return None
+    headers = {
+        "ETag": f'"{user_id}-{version}"',
+        "Cache-Control": "private, no-cache",
+    }
+    # Last-Modified has one-second resolution: it names the end of the write's second, and is
+    # only sent once that second is over, so no later write can share it and pass for unchanged
+    last_modified = -(-version // 10**9)
+    if last_modified * 10**9 <= time.time_ns():
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        unchanged = headers["ETag"] in tags or "*" in tags
+    else:
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+            unchanged = version <= since.timestamp() * 10**9
+        except (KeyError, TypeError, ValueError):
+            unchanged = False
+    return Response(status_code=304, headers=headers) if unchanged else None
+
+
+def json_response(content, response: Response = None):
+    # Rows go straight to orjson; headers set on the injected Response (ETag etc.) are carried over
+    return FastJSONResponse(content, headers=dict(response.headers) if response is not None else None)
 
 
 @app.get("/")
@@ -54,6 +143,13 @@ def root():
     return {"message": "Welcome to the Expense API!"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Prometheus scrape endpoint; unauthenticated, so keep it off the public listener
+    body, content_type = metrics.exposition()
+    return Response(content=body, media_type=content_type)
+
+
 @app.post("/create_user/")
 def create_user(user: UserCreate):
     try:
@@ -64,9 +160,9 @@ def create_user(user: UserCreate):
 
 
 @app.post("/login/")
-def login(user: UserCreate):
-    db_user = db_helper.get_user_by_username(user.username)
-    if not db_user or not db_helper.verify_user(user.username, user.password):
+async def login(user: UserCreate):
+    db_user = await async_db_helper.authenticate_user(user.username, user.password)
+    if not db_user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
 
     token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -75,39 +171,189 @@ def login(user: UserCreate):
     return {"access_token": token, "token_type": "bearer"}
 
 
-@app.get("/expenses/", response_model=List[Expense])
-def get_expenses(expense_date: date, current_user: dict = Depends(get_current_user)):
-    expenses = db_helper.fetch_user_expenses(current_user["id"], expense_date)
-    return expenses
+# The handler returns a FastJSONResponse (or a 304), which FastAPI passes through without
+# validating; Expense only documents the body
+@app.get("/expenses/", response_class=FastJSONResponse, responses={
+    200: {"model": List[Expense], "description": "Expenses of the user on expense_date"},
+    304: {"description": "Unchanged since the ETag or Last-Modified the client sent"},
+})
+async def get_expenses(expense_date: date, request: Request, response: Response,
+                       current_user: dict = Depends(get_current_user)):
+    user_id = current_user["id"]
+    not_modified_response = await not_modified(request, response, user_id)
+    if not_modified_response is not None:
+        return not_modified_response
+    expenses = await cache.aget_or_load(
+        read_cache,
+        (user_id, "expenses", expense_date),
+        lambda: async_db_helper.fetch_user_expenses(user_id, expense_date)
+    )
+    return json_response(
+        [{"amount": row["amount"], "category": row["category"], "notes": row["notes"]} for row in expenses],
+        response
+    )
+
+
+@app.get("/expenses/batch")
+async def get_expenses_batch(request: Request, response: Response,
+                             start_date: Optional[date] = None, end_date: Optional[date] = None,
+                             dates: Optional[List[date]] = Query(None), fields: Optional[str] = None,
+                             current_user: dict = Depends(get_current_user)):
+    # Expenses for a date range or for ?dates=...&dates=..., grouped by date, from one query
+    if dates:
+        if start_date or end_date:
+            raise HTTPException(status_code=400, detail="Pass either dates or start_date/end_date, not both")
+        days = sorted(set(dates))
+    elif start_date and end_date:
+        if start_date > end_date:
+            raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+        days = [start_date + timedelta(days=i) for i in range(min((end_date - start_date).days + 1, MAX_BATCH_DAYS + 1))]
+    else:
+        raise HTTPException(status_code=400, detail="Pass dates or both start_date and end_date")
+    if len(days) > MAX_BATCH_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_DAYS} dates per request")
+
+    selected = tuple(dict.fromkeys(fields.split(","))) if fields else db_helper.EXPENSE_FIELDS
+    unknown = [field for field in selected if field not in db_helper.EXPENSE_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400,
+                            detail=f"fields must be a comma-separated subset of: {', '.join(db_helper.EXPENSE_FIELDS)}")
+
+    user_id = current_user["id"]
+    not_modified_response = await not_modified(request, response, user_id)
+    if not_modified_response is not None:
+        return not_modified_response
+    range_args = {"dates": days} if dates else {"start_date": start_date, "end_date": end_date}
+    expenses = await cache.aget_or_load(
+        read_cache,
+        (user_id, "expenses_batch", tuple(days) if dates else (start_date, end_date), selected),
+        lambda: async_db_helper.fetch_user_expenses_for_dates(user_id, days, selected, **range_args)
+    )
+    return json_response({"expenses": expenses}, response)
 
 
 @app.post("/expenses/")
-def add_expense(expense_date: date, expenses: List[Expense], current_user: dict = Depends(get_current_user)):
-    # Delete existing expenses for this user and date
-    db_helper.delete_user_expenses_for_date(current_user["id"], expense_date)
-    # Add new expenses
-    for expense in expenses:
-        db_helper.insert_expense(
-            current_user["id"],
-            expense_date,
-            expense.amount,
-            expense.category,
-            expense.notes
-        )
+async def add_expense(expense_date: date, expenses: List[Expense], current_user: dict = Depends(get_current_user)):
+    # Replace existing expenses for this user and date in one transaction
+    await async_db_helper.replace_user_expenses_for_date(
+        current_user["id"],
+        expense_date,
+        [(expense.amount, expense.category, expense.notes) for expense in expenses]
+    )
+    await read_cache.ainvalidate_user(current_user["id"])
+    await invalidate_snapshot(current_user["id"], [expense_date])
     return {"message": "Expenses added successfully"}
+
+
+async def invalidate_snapshot(user_id: int, dates):
+    # Writes before the snapshot cutoff make the Parquet snapshot stale; analytics fall back to MySQL.
+    # Marking it touches the disk, so it runs in the threadpool rather than on the event loop
+    if columnar_analytics.COLUMNAR_ANALYTICS_ENABLED:
+        await run_in_threadpool(columnar_analytics.store.invalidate, user_id, dates)
+
+
+@app.post("/expenses/bulk/")
+async def bulk_ingest_expenses(request: Request, format: Optional[str] = None,
+                               current_user: dict = Depends(get_current_user)):
+    # Streams an NDJSON or CSV body covering many dates; each date present is replaced
+    fmt = format or ingest.body_format(request.headers.get("content-type"))
+    if fmt not in ("ndjson", "csv"):
+        raise HTTPException(status_code=415, detail="Send an NDJSON (application/x-ndjson) or CSV (text/csv) body")
+
+    user_id = current_user["id"]
+
+    async def write_batch(rows_by_date, replace_dates):
+        await run_in_threadpool(db_helper.write_expense_batch, user_id, rows_by_date, replace_dates)
+        await read_cache.ainvalidate_user(user_id)
+        await invalidate_snapshot(user_id, list(rows_by_date) + list(replace_dates))
+
+    try:
+        summary = await ingest.ingest_records(
+            ingest.iter_records(request.stream(), fmt),
+            write_batch,
+            batch_rows=INGEST_BATCH_ROWS
+        )
+    except ingest.IngestError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {fmt} body at {e}; earlier batches were saved")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8 encoded")
+
+    summary["message"] = "Expenses imported successfully"
+    return summary
+
+
+def parse_page_cursor(cursor: str):
+    # Page cursors are "<expense_date>:<id>" of the last row on the previous page
+    try:
+        cursor_date, cursor_id = cursor.split(":")
+        return date.fromisoformat(cursor_date), int(cursor_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @app.get("/all_expenses/")
-def get_all_expenses(current_user: dict = Depends(get_current_user)):
-    expenses = db_helper.fetch_all_expenses_for_user(current_user["id"])
-    return expenses
+def get_all_expenses(limit: int = 100, cursor: Optional[str] = None,
+                     current_user: dict = Depends(get_current_user)):
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    after_date, after_id = parse_page_cursor(cursor) if cursor else (None, None)
+
+    expenses = db_helper.fetch_user_expenses_page(current_user["id"], limit, after_date, after_id)
+    next_cursor = None
+    if len(expenses) == limit:
+        last = expenses[-1]
+        next_cursor = f"{last['expense_date'].isoformat()}:{last['id']}"
+    return json_response({"expenses": expenses, "next_cursor": next_cursor})
+
+
+@app.get("/all_expenses/export")
+def export_all_expenses(format: str = "ndjson", current_user: dict = Depends(get_current_user)):
+    if format not in export.WRITERS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(export.WRITERS)}")
+
+    chunks = export.WRITERS[format](
+        db_helper.EXPORT_COLUMNS,
+        db_helper.iter_all_user_expenses(current_user["id"])
+    )
+    return StreamingResponse(
+        chunks,
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="expenses.{format}"'}
+    )
 
 @app.post("/analytics/")
-def get_analytics(date_range: DateRange, current_user: dict = Depends(get_current_user)):
-    data = db_helper.fetch_user_expense_summary(
-        current_user["id"],
-        date_range.start_date,
-        date_range.end_date
+async def get_analytics(date_range: DateRange, current_user: dict = Depends(get_current_user)):
+    breakdown = await load_category_breakdown(current_user["id"], date_range.start_date, date_range.end_date)
+    return json_response(breakdown)
+
+
+@app.get("/analytics/")
+async def get_analytics_conditional(start_date: date, end_date: date, request: Request, response: Response,
+                                    current_user: dict = Depends(get_current_user)):
+    # Same as POST /analytics/, but as a GET so that clients can revalidate it with If-None-Match
+    not_modified_response = await not_modified(request, response, current_user["id"])
+    if not_modified_response is not None:
+        return not_modified_response
+    breakdown = await load_category_breakdown(current_user["id"], start_date, end_date)
+    return json_response(breakdown, response)
+
+
+async def load_category_breakdown(user_id: int, start_date: date, end_date: date):
+    return await cache.aget_or_load(
+        read_cache,
+        (user_id, "analytics", start_date, end_date),
+        lambda: compute_category_breakdown(user_id, start_date, end_date)
     )
 
+
+async def compute_category_breakdown(user_id: int, start_date: date, end_date: date):
+    data = None
+    if columnar_analytics.should_use(start_date, end_date):
+        # Long ranges are aggregated from the Parquet snapshot plus the recent tail from MySQL
+        data = await run_in_threadpool(columnar_analytics.category_totals, user_id, start_date, end_date)
+    if data is None:
+        data = await async_db_helper.fetch_user_expense_summary(user_id, start_date, end_date)
+
     if data is None:
         raise HTTPException(status_code=500, detail="failed to fetch data")
 
@@ -123,10 +369,52 @@ def get_analytics(date_range: DateRange, current_user: dict = Depends(get_curren
     return breakdown
 
 
+@app.get("/analytics/summary")
+async def get_analytics_summary(request: Request, response: Response,
+                                start_date: Optional[date] = None, end_date: Optional[date] = None,
+                                group_by: str = "month", max_points: Optional[int] = None,
+                                current_user: dict = Depends(get_current_user)):
+    # Totals, distribution and category/month matrices from a single read of the daily rollup
+    if group_by not in analytics.GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(analytics.GROUP_BY)}")
+    start_date = start_date or analytics.EARLIEST_DATE
+    end_date = end_date or analytics.LATEST_DATE
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    if max_points is not None and max_points < 3:
+        raise HTTPException(status_code=400, detail="max_points must be at least 3")
+
+    user_id = current_user["id"]
+    not_modified_response = await not_modified(request, response, user_id)
+    if not_modified_response is not None:
+        return not_modified_response
+
+    async def load():
+        rows = await async_db_helper.fetch_user_daily_rollup(user_id, start_date, end_date)
+        summary = analytics.summarize(rows, group_by, max_points)
+        summary.update(start_date=start_date, end_date=end_date)
+        return summary
+
+    summary = await cache.aget_or_load(
+        read_cache,
+        (user_id, "analytics_summary", start_date, end_date, group_by, max_points),
+        load
+    )
+    return json_response(summary, response)
+
+
 @app.get("/analytics_by_month/")
-def get_analytics_by_month(current_user: dict = Depends(get_current_user)):
-    data = db_helper.fetch_user_expenses_by_month(current_user["id"])
+async def get_analytics_by_month(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    user_id = current_user["id"]
+    not_modified_response = await not_modified(request, response, user_id)
+    if not_modified_response is not None:
+        return not_modified_response
+    data = await cache.aget_or_load(
+        read_cache,
+        (user_id, "analytics_by_month"),
+        lambda: async_db_helper.fetch_user_expenses_by_month(user_id)
+    )
     if data is None:
         raise HTTPException(status_code=500, detail="failed to fetch data")
 
-    return data
\ No newline at end of file
+    return json_response(data, response)
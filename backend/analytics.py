@@ -0,0 +1,124 @@
+from datetime import date
+from decimal import Decimal
+
+GROUP_BY = ('day', 'week', 'month', 'category')
+PERCENTILES = (50, 90, 95)
+
+# Bounds of the MySQL DATE type, used when a summary covers the whole history
+EARLIEST_DATE = date(1000, 1, 1)
+LATEST_DATE = date(9999, 12, 31)
+
+
+def group_key(row, group_by: str) -> str:
+    if group_by == 'category':
+        return row['category']
+    day = row['expense_date']
+    if group_by == 'day':
+        return day.isoformat()
+    if group_by == 'week':
+        year, week, _ = day.isocalendar()
+        return f'{year}-W{week:02d}'
+    return f'{day:%Y-%m}'
+
+
+def percentile(sorted_values, q):
+    """Linearly interpolated q-th percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * Decimal(q) / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def lttb(values, threshold: int):
+    """Indices of at most threshold points chosen by Largest-Triangle-Three-Buckets.
+
+    values are the y values of an evenly spaced series. The first and last points are
+    always kept. Each bucket in between keeps the point that forms the largest triangle
+    with the previously kept point and the average of the next bucket, which preserves
+    peaks and troughs far better than taking every n-th point.
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    ys = [float(value) for value in values]
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    previous = 0
+    for i in range(threshold - 2):
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((previous - avg_x) * (ys[j] - ys[previous]) - (previous - j) * (avg_y - ys[previous]))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        previous = best
+    kept.append(n - 1)
+    return kept
+
+
+def summarize(rows, group_by: str = 'month', max_points: int = None):
+    """Aggregate daily rollup rows (expense_date, category, total_amount, expense_count) in one pass.
+
+    The distribution figures (mean, min, max, percentiles) are over the group_by buckets, e.g. the
+    monthly totals, since the rollup no longer holds individual expenses. With max_points, a
+    time series longer than that is downsampled with lttb() for charting; the other figures
+    still cover every bucket.
+    """
+    total = Decimal(0)
+    count = 0
+    groups = {}
+    by_category = {}
+    by_month = {}
+    category_by_month = {}
+
+    for row in rows:
+        amount = Decimal(row['total_amount'])
+        total += amount
+        count += row['expense_count']
+
+        group = groups.setdefault(group_key(row, group_by), {'total': Decimal(0), 'count': 0})
+        group['total'] += amount
+        group['count'] += row['expense_count']
+
+        category = row['category']
+        month = f"{row['expense_date']:%Y-%m}"
+        by_category[category] = by_category.get(category, Decimal(0)) + amount
+        by_month[month] = by_month.get(month, Decimal(0)) + amount
+        months = category_by_month.setdefault(category, {})
+        months[month] = months.get(month, Decimal(0)) + amount
+
+    if group_by == 'category':
+        ordered = sorted(groups.items(), key=lambda item: item[1]['total'], reverse=True)
+    else:
+        ordered = sorted(groups.items())
+    group_totals = sorted(group['total'] for group in groups.values())
+    largest = max(ordered, key=lambda item: item[1]['total'], default=None)
+    series = ordered
+    if max_points is not None and group_by != 'category':
+        series = [ordered[i] for i in lttb([group['total'] for _, group in ordered], max_points)]
+
+    return {
+        'group_by': group_by,
+        'total': total,
+        'count': count,
+        'mean': total / count if count else None,
+        'groups': [{'key': key, 'total': group['total'], 'count': group['count']} for key, group in series],
+        'group_count': len(ordered),
+        'group_stats': {
+            'mean': total / len(groups) if groups else None,
+            'min': group_totals[0] if group_totals else None,
+            'max': group_totals[-1] if group_totals else None,
+            'max_key': largest[0] if largest else None,
+            'percentiles': {f'p{q}': percentile(group_totals, q) for q in PERCENTILES},
+        },
+        'by_category': dict(sorted(by_category.items(), key=lambda item: item[1], reverse=True)),
+        'by_month': dict(sorted(by_month.items())),
+        'category_by_month': {category: dict(sorted(months.items())) for category, months in category_by_month.items()},
+    }
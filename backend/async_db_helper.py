@@ -0,0 +1,174 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+
+import aiomysql
+
+import db_helper
+from logging_setup import setup_logger
+from metrics import POOL_WAIT, timed_query
+from tracing import tracer
+
+logger = setup_logger('async_db_helper')
+
+pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def init_pool():
+    global pool
+    if pool is not None:
+        return pool
+    async with _pool_lock:
+        if pool is not None:
+            return pool
+        config = db_helper.DB_CONFIG
+        pool = await aiomysql.create_pool(
+            host=config['host'],
+            port=config['port'],
+            user=config['user'],
+            password=config['password'],
+            db=config['database'],
+            minsize=int(os.getenv('ASYNC_DB_POOL_MIN_SIZE', 1)),
+            maxsize=int(os.getenv('ASYNC_DB_POOL_SIZE', 20)),
+            pool_recycle=float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+            # Reads run in autocommit so a released connection never holds an open snapshot;
+            # writes open an explicit transaction in get_db_cursor(commit=True)
+            autocommit=True,
+        )
+        logger.info('Created async MySQL pool (maxsize=%d)', pool.maxsize)
+        return pool
+
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        pool.close()
+        await pool.wait_closed()
+        pool = None
+
+
+@asynccontextmanager
+async def get_db_cursor(commit=False):
+    db_pool = await init_pool()
+    with tracer.start_as_current_span('async_db_helper.checkout', attributes={'db.system': 'mysql'}):
+        started = time.perf_counter()
+        connection = await db_pool.acquire()
+        POOL_WAIT.labels('async').observe(time.perf_counter() - started)
+    try:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            if commit:
+                await connection.begin()
+                try:
+                    yield cursor
+                    await connection.commit()
+                except BaseException:
+                    await connection.rollback()
+                    raise
+            else:
+                yield cursor
+    except BaseException:
+        # A failed or cancelled query can leave unread results or a half-finished exchange on
+        # the connection; close it so the pool drops it instead of handing it out again
+        connection.close()
+        raise
+    finally:
+        await db_pool.release(connection)
+
+
+#############################################################################
+
+@timed_query
+async def update_user_password_hash(username: str, old_hash: str, new_hash: str):
+    # Compare-and-set on the old hash so a concurrent password change is never overwritten
+    logger.info('Rehashing password for user: %s', username)
+    async with get_db_cursor(commit=True) as cursor:
+        await cursor.execute(db_helper.UPDATE_PASSWORD_HASH_SQL, (new_hash, username, old_hash))
+
+
+@timed_query
+async def authenticate_user(username: str, password: str):
+    """Check credentials with a single query; return {'id', 'username'} or None.
+
+    Unknown usernames still pay for a bcrypt verification against a dummy hash
+    of the same cost, so response times do not reveal which usernames exist.
+    """
+    logger.info('Authenticating user: %s', username)
+    row = None
+    if db_helper.unknown_users.get((username,)) is db_helper.MISS:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(db_helper.AUTHENTICATE_USER_SQL, (username,))
+            row = await cursor.fetchone()
+        if row is None:
+            # Only a lookup that ran caches the miss; answers from the cache must not extend
+            # its TTL, or a user who signed up on another worker stays unknown while retrying
+            db_helper.unknown_users.set((username,), True)
+    if row is None:
+        await db_helper.hasher.averify(password, await asyncio.to_thread(db_helper.dummy_hash))
+        return None
+
+    matches, new_hash = await db_helper.hasher.averify(password, row['hashed_password'])
+    if not matches:
+        return None
+    if new_hash:
+        await update_user_password_hash(username, row['hashed_password'], new_hash)
+    return {'id': row['id'], 'username': row['username']}
+
+
+@timed_query
+async def fetch_user_expenses(user_id: int, expense_date: date):
+    async with get_db_cursor() as cursor:
+        await cursor.execute(db_helper.FETCH_USER_EXPENSES_SQL, (expense_date, user_id))
+        return await cursor.fetchall()
+
+
+@timed_query
+async def fetch_user_expenses_for_dates(user_id: int, days, fields=db_helper.EXPENSE_FIELDS,
+                                        start_date: date = None, end_date: date = None, dates=None):
+    logger.info('Fetching expenses for user %s on %d dates', user_id, len(days))
+    sql, params = db_helper.expenses_for_dates_query(user_id, fields, start_date, end_date, dates)
+    async with get_db_cursor() as cursor:
+        await cursor.execute(sql, params)
+        return db_helper.group_expenses_by_date(await cursor.fetchall(), days)
+
+
+@timed_query
+async def fetch_user_expenses_by_month(user_id: int):
+    logger.info('Fetching monthly expenses for user %s', user_id)
+    async with get_db_cursor() as cursor:
+        await cursor.execute(db_helper.FETCH_USER_EXPENSES_BY_MONTH_SQL, (user_id,))
+        return await cursor.fetchall()
+
+
+@timed_query
+async def fetch_user_expense_summary(user_id: int, start_date: date, end_date: date):
+    logger.info('Fetching expense summary for user %s from %s to %s', user_id, start_date, end_date)
+    async with get_db_cursor() as cursor:
+        await cursor.execute(db_helper.FETCH_USER_EXPENSE_SUMMARY_SQL, (user_id, start_date, end_date))
+        return await cursor.fetchall()
+
+
+@timed_query
+async def fetch_user_daily_rollup(user_id: int, start_date: date, end_date: date):
+    logger.info('Fetching daily totals for user %s from %s to %s', user_id, start_date, end_date)
+    async with get_db_cursor() as cursor:
+        await cursor.execute(db_helper.FETCH_USER_DAILY_ROLLUP_SQL, (user_id, start_date, end_date))
+        return await cursor.fetchall()
+
+
+@timed_query
+async def replace_user_expenses_for_date(user_id: int, expense_date: date, rows,
+                                         batch_size: int = db_helper.INSERT_BATCH_SIZE):
+    # Same transaction shape as db_helper.replace_user_expenses_for_date
+    logger.info('Replacing expenses for user %s on date: %s', user_id, expense_date)
+    inserted = 0
+    async with get_db_cursor(commit=True) as cursor:
+        await cursor.execute(db_helper.DELETE_USER_EXPENSES_FOR_DATE_SQL, (expense_date, user_id))
+        for batch in db_helper.batched(db_helper.expense_rows(user_id, expense_date, rows), batch_size):
+            await cursor.executemany(db_helper.INSERT_EXPENSE_SQL, batch)
+            inserted += len(batch)
+        for statement, params in db_helper.rollup_refresh_statements(user_id, [expense_date]):
+            await cursor.execute(statement, params)
+    return inserted
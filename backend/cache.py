@@ -0,0 +1,286 @@
+import asyncio
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from logging_setup import setup_logger
+
+logger = setup_logger('cache')
+
+MISS = object()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a TTL.
+
+    Keys are tuples whose first element is the user id, so every entry of a
+    user can be dropped at once with invalidate_user(). Each user also has a data
+    version, a nanosecond timestamp bumped by invalidate_user(), for HTTP validators.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._user_keys = {}
+        self._generations = {}
+        # Users never invalidated since start-up are versioned with the start-up time, which
+        # is newer than anything a previous process could have handed out
+        self._started = time.time_ns()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return MISS
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            generation = self._generations.get(key[0], 0)
+        value = self.get(key)
+        if value is MISS:
+            value = loader()
+            if value is not None:
+                self.set(key, value, generation=generation)
+        return value
+
+    async def aget_or_load(self, key, loader):
+        with self._lock:
+            generation = self._generations.get(key[0], 0)
+        value = self.get(key)
+        if value is MISS:
+            value = await loader()
+            if value is not None:
+                self.set(key, value, generation=generation)
+        return value
+
+    async def ainvalidate_user(self, user_id):
+        self.invalidate_user(user_id)
+
+    def data_version(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, self._started)
+
+    async def adata_version(self, user_id):
+        return self.data_version(user_id)
+
+    def set(self, key, value, ttl=None, generation=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and generation != self._generations.get(key[0], 0):
+                return  # the user was invalidated while the value was being loaded
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            self._user_keys.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def delete(self, key):
+        # Drops one entry without touching the user's generation or data version
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._versions[user_id] = max(time.time_ns(), self._versions.get(user_id, self._started) + 1)
+            keys = self._user_keys.pop(user_id, ())
+            for key in keys:
+                del self._entries[key]
+            self._stats['invalidations'] += len(keys)
+
+    def clear(self):
+        # Data versions survive: clearing the cache does not change the data they describe
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+            self._generations.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), maxsize=self.maxsize)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _remove(self, key):
+        del self._entries[key]
+        user_keys = self._user_keys.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._user_keys[key[0]]
+
+
+class RedisCache:
+    """Cache shared by every worker through a Redis-compatible server.
+
+    Each user has a generation counter that is part of every key of that user.
+    invalidate_user() increments it, which orphans all of the user's entries for
+    every worker at once; the orphans then age out through their TTL. Redis
+    errors are logged and treated as misses so the API keeps serving from MySQL.
+    The per-user data version is stored alongside the generation so that every
+    worker hands out the same validators.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', ttl=300.0, prefix='expense-cache', client=None):
+        if client is None:
+            import redis  # optional dependency, only needed for CACHE_BACKEND=redis
+            client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = client
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'errors': 0, 'invalidations': 0}
+
+    def get(self, key):
+        return self._get(key, self._safe_generation(key[0]))
+
+    def get_or_load(self, key, loader):
+        # Entries are written under the generation read before loading, so a load that
+        # races with an invalidation lands on an already-orphaned key
+        generation = self._safe_generation(key[0])
+        value = self._get(key, generation)
+        if value is MISS:
+            value = loader()
+            if value is not None and generation is not None:
+                self._set(key, value, generation)
+        return value
+
+    async def aget_or_load(self, key, loader):
+        # The client is synchronous, so its round trips run in a worker thread
+        generation = await asyncio.to_thread(self._safe_generation, key[0])
+        value = await asyncio.to_thread(self._get, key, generation)
+        if value is MISS:
+            value = await loader()
+            if value is not None and generation is not None:
+                await asyncio.to_thread(self._set, key, value, generation)
+        return value
+
+    async def ainvalidate_user(self, user_id):
+        await asyncio.to_thread(self.invalidate_user, user_id)
+
+    def data_version(self, user_id):
+        # None when Redis is unreachable; callers then skip conditional responses
+        key = self._version_key(user_id)
+        try:
+            version = self._client.get(key)
+            if version is None:
+                # First look at this user: agree on one version across workers
+                self._client.set(key, time.time_ns(), nx=True)
+                version = self._client.get(key)
+            return int(version)
+        except Exception as e:
+            self._count('errors')
+            logger.warning('Cache read failed: %s', e)
+            return None
+
+    async def adata_version(self, user_id):
+        return await asyncio.to_thread(self.data_version, user_id)
+
+    def set(self, key, value, ttl=None):
+        generation = self._safe_generation(key[0])
+        if generation is not None:
+            self._set(key, value, generation, ttl)
+
+    def _get(self, key, generation):
+        payload = None
+        if generation is not None:
+            try:
+                payload = self._client.get(self._data_key(key, generation))
+            except Exception as e:
+                self._count('errors')
+                logger.warning('Cache read failed: %s', e)
+        if payload is None:
+            self._count('misses')
+            return MISS
+        self._count('hits')
+        return pickle.loads(payload)
+
+    def _set(self, key, value, generation, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            self._client.set(
+                self._data_key(key, generation),
+                pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+                px=max(int(ttl * 1000), 1)
+            )
+        except Exception as e:
+            self._count('errors')
+            logger.warning('Cache write failed: %s', e)
+
+    def invalidate_user(self, user_id):
+        try:
+            self._client.incr(self._generation_key(user_id))
+            self._client.set(self._version_key(user_id), time.time_ns())
+        except Exception as e:
+            # The write itself has committed; stale entries still expire after the TTL
+            self._count('errors')
+            logger.error('Cache invalidation failed for user %s: %s', user_id, e)
+            return
+        self._count('invalidations')
+
+    def clear(self):
+        for key in self._client.scan_iter(match=f'{self.prefix}:*'):
+            self._client.delete(key)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _safe_generation(self, user_id):
+        try:
+            return int(self._client.get(self._generation_key(user_id)) or 0)
+        except Exception as e:
+            self._count('errors')
+            logger.warning('Cache read failed: %s', e)
+            return None
+
+    def _generation_key(self, user_id):
+        return f'{self.prefix}:gen:{user_id}'
+
+    def _version_key(self, user_id):
+        return f'{self.prefix}:version:{user_id}'
+
+    def _data_key(self, key, generation):
+        return f'{self.prefix}:{key[0]}:{generation}:{key[1:]!r}'
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+def create_cache(backend='memory', maxsize=1024, ttl=300.0, url=None):
+    if backend == 'memory':
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    if backend == 'redis':
+        return RedisCache(url or 'redis://localhost:6379/0', ttl=ttl)
+    raise ValueError(f'Unknown cache backend: {backend}')
+
+
+def get_or_load(cache, key, loader):
+    return cache.get_or_load(key, loader)
+
+
+async def aget_or_load(cache, key, loader):
+    return await cache.aget_or_load(key, loader)
@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import date
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from logging_setup import setup_logger
+
+logger = setup_logger('columnar_analytics')
+
+COLUMNAR_ANALYTICS_ENABLED = os.getenv('COLUMNAR_ANALYTICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')
+# Ranges shorter than this are answered from the daily rollup, which is already cheap
+COLUMNAR_MIN_RANGE_DAYS = int(os.getenv('COLUMNAR_MIN_RANGE_DAYS', 180))
+
+MANIFEST = 'manifest.json'
+INVALIDATED = 'invalidated'
+SCHEMA = pa.schema([
+    ('expense_date', pa.date32()),
+    ('category', pa.string()),
+    ('amount_cents', pa.int64()),
+])
+
+
+def to_cents(amount) -> int:
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+class SnapshotStore:
+    """Per-user Parquet snapshots of daily totals per category dated before a cutoff.
+
+    Layout: <root>/user_id=<id>/v<timestamp>/year=<YYYY>.parquet plus a manifest.json
+    naming the live version and its cutoff (the first day of the month the snapshot
+    was taken). Everything from the cutoff onwards is still read from MySQL.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def user_dir(self, user_id: int) -> str:
+        return os.path.join(self.root, f'user_id={user_id}')
+
+    def manifest(self, user_id: int):
+        try:
+            with open(os.path.join(self.user_dir(user_id), MANIFEST)) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        manifest['cutoff'] = date.fromisoformat(manifest['cutoff'])
+        return manifest
+
+    def write(self, user_id: int, batches, cutoff: date):
+        """Write a new snapshot version from batches of (expense_date, amount, category) rows."""
+        user_dir = self.user_dir(user_id)
+        started = time.time_ns()
+        version = f'v{started}'
+        version_dir = os.path.join(user_dir, version)
+        os.makedirs(version_dir)
+
+        writers = {}
+        rows = 0
+        try:
+            for batch in batches:
+                by_year = {}
+                for expense_date, amount, category in batch:
+                    columns = by_year.setdefault(expense_date.year, ([], [], []))
+                    columns[0].append(expense_date)
+                    columns[1].append(category)
+                    columns[2].append(to_cents(amount))
+                for year, columns in by_year.items():
+                    if year not in writers:
+                        writers[year] = pq.ParquetWriter(os.path.join(version_dir, f'year={year}.parquet'), SCHEMA)
+                    writers[year].write_table(pa.Table.from_arrays(
+                        [pa.array(column, type=field.type) for column, field in zip(columns, SCHEMA)],
+                        schema=SCHEMA
+                    ))
+                    rows += len(columns[0])
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        # Readers only ever follow the manifest, so swapping it publishes the new version atomically
+        manifest_path = os.path.join(user_dir, MANIFEST)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump({'version': version, 'cutoff': cutoff.isoformat(), 'years': sorted(writers), 'rows': rows}, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+        # Checked after publishing: invalidate() logs the write before it looks at the manifest,
+        # so a write racing the swap is seen either here or by invalidate() itself
+        if self._invalidated_since(user_id, started, cutoff):
+            # A write below the cutoff landed while we were reading; this snapshot may already be stale
+            self._unpublish(user_id, version)
+            shutil.rmtree(version_dir, ignore_errors=True)
+            logger.info('Discarded snapshot of user %s: expenses before %s changed meanwhile', user_id, cutoff)
+            return None
+
+        self._remove_old_versions(user_id, keep=version)
+        self._trim_invalidations(user_id, started)
+        logger.info('Snapshotted %s daily totals for user %s before %s as %s', rows, user_id, cutoff, version)
+        return rows
+
+    def _invalidations(self, user_id: int):
+        # (time_ns, earliest date) of every write logged by invalidate()
+        try:
+            with open(os.path.join(self.user_dir(user_id), INVALIDATED)) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                invalidated_at, earliest = line.split()
+                entries.append((int(invalidated_at), date.fromisoformat(earliest)))
+            except ValueError:
+                continue  # a line still being appended
+        return entries
+
+    def _invalidated_since(self, user_id: int, started: int, cutoff: date):
+        return any(at >= started and earliest < cutoff for at, earliest in self._invalidations(user_id))
+
+    def _trim_invalidations(self, user_id: int, before: int):
+        # Entries older than the snapshot just published cannot affect it or any later one
+        path = os.path.join(self.user_dir(user_id), INVALIDATED)
+        kept = [f'{at} {earliest.isoformat()}\n' for at, earliest in self._invalidations(user_id) if at >= before]
+        with open(path + '.tmp', 'w') as f:
+            f.writelines(kept)
+        os.replace(path + '.tmp', path)
+
+    def _unpublish(self, user_id: int, version: str):
+        manifest = self.manifest(user_id)
+        if manifest is not None and manifest['version'] == version:
+            try:
+                os.remove(os.path.join(self.user_dir(user_id), MANIFEST))
+            except FileNotFoundError:
+                pass
+
+    def _remove_old_versions(self, user_id: int, keep: str):
+        user_dir = self.user_dir(user_id)
+        for name in os.listdir(user_dir):
+            if name.startswith('v') and name != keep:
+                shutil.rmtree(os.path.join(user_dir, name), ignore_errors=True)
+
+    def invalidate(self, user_id: int, dates):
+        """Drop the user's snapshot if any of dates falls before its cutoff."""
+        dates = list(dates)
+        if not dates or not os.path.isdir(self.user_dir(user_id)):
+            return False
+        # Logged, never overwritten, so that a snapshot being taken right now does not publish the old
+        # data even if later writes only touch dates after its cutoff
+        with open(os.path.join(self.user_dir(user_id), INVALIDATED), 'a') as f:
+            f.write(f'{time.time_ns()} {min(dates).isoformat()}\n')
+
+        manifest = self.manifest(user_id)
+        if manifest is None or all(day >= manifest['cutoff'] for day in dates):
+            return False
+        try:
+            os.remove(os.path.join(self.user_dir(user_id), MANIFEST))
+        except FileNotFoundError:
+            pass
+        logger.info('Snapshot of user %s invalidated by a write before %s', user_id, manifest['cutoff'])
+        return True
+
+    def read(self, user_id: int, start_date: date = None, end_date: date = None):
+        """(manifest, table) of snapshotted rows within the range, or None if there is no snapshot."""
+        manifest = self.manifest(user_id)
+        if manifest is None:
+            return None
+        version_dir = os.path.join(self.user_dir(user_id), manifest['version'])
+        years = [
+            year for year in manifest['years']
+            if (start_date is None or year >= start_date.year) and (end_date is None or year <= end_date.year)
+        ]
+        filters = []
+        if start_date is not None:
+            filters.append(('expense_date', '>=', start_date))
+        if end_date is not None:
+            filters.append(('expense_date', '<=', end_date))
+
+        tables = []
+        try:
+            for year in years:
+                tables.append(pq.read_table(
+                    os.path.join(version_dir, f'year={year}.parquet'),
+                    memory_map=True,
+                    filters=filters or None
+                ))
+        except FileNotFoundError:
+            # Lost a race with a newer snapshot removing this version
+            return None
+        table = pa.concat_tables(tables) if tables else SCHEMA.empty_table()
+        return manifest, table
+
+
+store = SnapshotStore(SNAPSHOT_DIR)
+
+
+def should_use(start_date: date, end_date: date) -> bool:
+    return COLUMNAR_ANALYTICS_ENABLED and (end_date - start_date).days >= COLUMNAR_MIN_RANGE_DAYS
+
+
+def _sum_by(table, column):
+    grouped = table.group_by(column).aggregate([('amount_cents', 'sum')])
+    return dict(zip(grouped[column].to_pylist(), grouped['amount_cents_sum'].to_pylist()))
+
+
+def category_totals(user_id: int, start_date: date, end_date: date, fetch_tail=None):
+    """Same rows as db_helper.fetch_user_expense_summary, or None when there is no snapshot.
+
+    fetch_tail(user_id, start, end) supplies the rows dated on or after the snapshot cutoff.
+    """
+    snapshot = store.read(user_id, start_date, end_date)
+    if snapshot is None:
+        return None
+    manifest, table = snapshot
+    totals = {category: from_cents(cents) for category, cents in _sum_by(table, 'category').items()}
+
+    tail_start = max(start_date, manifest['cutoff'])
+    if tail_start <= end_date:
+        if fetch_tail is None:
+            import db_helper
+            fetch_tail = db_helper.fetch_user_expense_summary
+        for row in fetch_tail(user_id, tail_start, end_date):
+            totals[row['category']] = totals.get(row['category'], Decimal(0)) + Decimal(row['total'])
+    return [{'category': category, 'total': total} for category, total in totals.items()]
+
+
+def snapshot_user(user_id: int, today: date = None):
+    import db_helper
+    cutoff = (today or date.today()).replace(day=1)
+    # From the daily rollup rather than expenses: it still has the months partitions.py archived,
+    # so snapshot totals match what the rollup path answers for the same range
+    return store.write(user_id, db_helper.iter_user_daily_rollup(user_id, before=cutoff), cutoff)
+
+
+def snapshot_all(user_ids=None):
+    import db_helper
+    for user_id in user_ids or db_helper.fetch_user_ids():
+        snapshot_user(user_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot expenses into Parquet files for long-range analytics.')
+    parser.add_argument('command', choices=['snapshot'])
+    parser.add_argument('--user-id', type=int, action='append', help='only snapshot these users (repeatable)')
+    parser.add_argument('--interval', type=float, default=None,
+                        help='keep running and take a new snapshot every this many seconds')
+    args = parser.parse_args()
+
+    while True:
+        snapshot_all(args.user_id)
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+
+try:
+    import brotli  # optional; br is only offered when it is installed
+except ImportError:
+    brotli = None
+
+# Already compressed; recompressing only burns CPU
+COMPRESSED_TYPES = ('application/vnd.apache.parquet', 'application/gzip', 'application/zip', 'image/')
+
+
+class _SkipCompressedTypes:
+    async def send_with_compression(self, message):
+        await super().send_with_compression(message)
+        if message['type'] == 'http.response.start':
+            if Headers(raw=message['headers']).get('content-type', '').startswith(COMPRESSED_TYPES):
+                self.content_type_is_excluded = True
+
+
+class _GZipResponder(_SkipCompressedTypes, GZipResponder):
+    pass
+
+
+class _BrotliResponder(_SkipCompressedTypes, IdentityResponder):
+    content_encoding = 'br'
+
+    def __init__(self, app, minimum_size, quality):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body, *, more_body):
+        compressed = self.compressor.process(body)
+        if more_body:
+            return compressed + self.compressor.flush()
+        return compressed + self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compresses responses of at least minimum_size bytes with br (if available) or gzip.
+
+    Same semantics as starlette's GZipMiddleware, which it builds on, plus brotli and a
+    skip list for content types that are already compressed.
+    """
+
+    def __init__(self, app, minimum_size=1000, gzip_level=6, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get('Accept-Encoding', '')
+        if brotli is not None and 'br' in accept_encoding:
+            responder = _BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif 'gzip' in accept_encoding:
+            responder = _GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
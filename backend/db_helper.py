@@ -1,122 +1,445 @@
+import os
+import time
+import functools
 import mysql.connector
 from contextlib import contextmanager
 from logging_setup import setup_logger
-from passlib.context import CryptContext
-from datetime import date
+from datetime import date, timedelta
+from db_pool import ConnectionPool
+from password_hashing import PasswordHasher
+from cache import MISS, TTLCache
+from metrics import POOL_WAIT, timed_query
+from tracing import tracer
 logger = setup_logger('db_helper')
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+hasher = PasswordHasher(
+    rounds=int(os.getenv('BCRYPT_ROUNDS', 12)),
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2)),
+    queue_limit=int(os.getenv('PASSWORD_HASH_QUEUE_LIMIT', 64)),
+)
 
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', 'Dand@2018'),
+    'database': os.getenv('DB_NAME', 'expense_manager'),
+}
+
+pool = ConnectionPool(
+    lambda: mysql.connector.connect(**DB_CONFIG),
+    size=int(os.getenv('DB_POOL_SIZE', 5)),
+    max_overflow=int(os.getenv('DB_POOL_MAX_OVERFLOW', 5)),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+    ping_interval=float(os.getenv('DB_POOL_PING_INTERVAL', 30)),
+)
+# Usernames recently looked up and not found. Kept short-lived because a sign-up handled by
+# another worker cannot invalidate this process's entries.
+unknown_users = TTLCache(
+    maxsize=int(os.getenv('UNKNOWN_USER_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('UNKNOWN_USER_CACHE_TTL_SECONDS', 30))
+)
+INSERT_BATCH_SIZE = int(os.getenv('DB_INSERT_BATCH_SIZE', 500))
+EXPORT_FETCH_SIZE = int(os.getenv('DB_EXPORT_FETCH_SIZE', 1000))
+EXPORT_COLUMNS = ('id', 'expense_date', 'amount', 'category', 'notes')
+
+# Statements shared with async_db_helper, which runs the hot paths on an asyncio driver.
+# expenses is range-partitioned by month: filter it with bare comparisons on expense_date
+# (=, IN, BETWEEN, <, >=), never a function of it, so MySQL can prune partitions.
+GET_USER_BY_USERNAME_SQL = "SELECT * FROM users WHERE username = %s"
+AUTHENTICATE_USER_SQL = "SELECT id, username, hashed_password FROM users WHERE username = %s"
+UPDATE_PASSWORD_HASH_SQL = "UPDATE users SET hashed_password = %s WHERE username = %s AND hashed_password = %s"
+FETCH_USER_EXPENSES_SQL = \
+    "SELECT expense_date, amount, category, notes FROM expenses WHERE expense_date = %s AND user_id = %s"
+EXPENSE_FIELDS = ('amount', 'category', 'notes')
+FETCH_USER_EXPENSES_BY_MONTH_SQL = '''SELECT month_year, total_amount FROM expense_monthly_rollup
+                          WHERE user_id = %s
+                          ORDER BY month_year;'''
+FETCH_USER_EXPENSE_SUMMARY_SQL = '''SELECT category, SUM(total_amount) as total
+               FROM expense_daily_rollup WHERE user_id = %s AND expense_date BETWEEN %s AND %s
+               GROUP BY category;'''
+FETCH_USER_DAILY_ROLLUP_SQL = '''SELECT expense_date, category, total_amount, expense_count
+               FROM expense_daily_rollup WHERE user_id = %s AND expense_date BETWEEN %s AND %s
+               ORDER BY expense_date, category;'''
+DELETE_USER_EXPENSES_FOR_DATE_SQL = 'DELETE FROM expenses WHERE expense_date=%s AND user_id=%s'
+INSERT_EXPENSE_SQL = \
+    "INSERT INTO expenses (user_id, expense_date, amount, category, notes) VALUES (%s, %s, %s, %s, %s)"
+FETCH_FIRST_EXPENSES_PAGE_SQL = '''SELECT id, expense_date, amount, category, notes FROM expenses
+                   WHERE user_id = %s
+                   ORDER BY expense_date, id LIMIT %s'''
+FETCH_NEXT_EXPENSES_PAGE_SQL = '''SELECT id, expense_date, amount, category, notes FROM expenses
+                   WHERE user_id = %s AND expense_date >= %s
+                     AND (expense_date > %s OR id > %s)
+                   ORDER BY expense_date, id LIMIT %s'''
+EXPORT_USER_EXPENSES_SQL = '''SELECT id, expense_date, amount, category, notes FROM expenses
+               WHERE user_id = %s ORDER BY expense_date, id'''
+DAILY_ROLLUP_BEFORE_SQL = '''SELECT expense_date, total_amount, category FROM expense_daily_rollup
+               WHERE user_id = %s AND expense_date < %s ORDER BY expense_date, category'''
 
-@contextmanager
-def get_db_cursor(commit=False):
-    mysql_connection = mysql.connector.connect(
-        host='localhost',
-        user='root',
-        password='Dand@2018',
-        database='expense_manager'
-    )
-
-    if mysql_connection.is_connected():
-        print('MySQL connection is connected')
-    else:
-        print('MySQL connection is not connected')
 
-    cursor = mysql_connection.cursor(dictionary=True)
-    yield cursor
+def get_pool_stats():
+    return pool.stats()
 
-    if commit:
-        mysql_connection.commit()
-    cursor.close()
-    mysql_connection.close()
+
+@contextmanager
+def get_db_cursor(commit=False, dictionary=True):
+    with tracer.start_as_current_span('db_helper.checkout', attributes={'db.system': 'mysql'}):
+        started = time.perf_counter()
+        mysql_connection = pool.acquire()
+        POOL_WAIT.labels('sync').observe(time.perf_counter() - started)
+    cursor = None
+    healthy = True
+    try:
+        # Inside the try, so a connection that cannot open a cursor still goes back to the pool
+        cursor = mysql_connection.cursor(dictionary=dictionary)
+        yield cursor
+        if commit:
+            mysql_connection.commit()
+        elif mysql_connection.in_transaction:
+            # End the read snapshot so the next checkout of this connection sees fresh data
+            mysql_connection.rollback()
+    except BaseException:
+        try:
+            mysql_connection.rollback()
+        except Exception:
+            healthy = False
+        raise
+    finally:
+        try:
+            if cursor is not None:
+                cursor.close()
+        except Exception:
+            healthy = False
+        pool.release(mysql_connection, discard=not healthy)
 #############################################################################
 
+@timed_query
 def create_user(username: str, password: str):
-    logger.info(f'Creating user: {username}')
-    hashed_password = pwd_context.hash(password)
+    logger.info('Creating user: %s', username)
+    hashed_password = hasher.hash(password)
     with get_db_cursor(commit=True) as cursor:
         cursor.execute(
             "INSERT INTO users (username, hashed_password) VALUES (%s, %s)",
             (username, hashed_password)
         )
+    unknown_users.delete((username,))
 
-def verify_user(username: str, password: str) -> bool:
-    logger.info(f'Verifying user: {username}')
-    with get_db_cursor() as cursor:
-        cursor.execute("SELECT hashed_password FROM users WHERE username = %s", (username,))
-        result = cursor.fetchone()
-        return result and pwd_context.verify(password, result['hashed_password'])
+
+@functools.cache
+def dummy_hash():
+    return hasher.hash('dummy password for timing equalization')
 
 
+@timed_query
+def fetch_user_ids():
+    with get_db_cursor(dictionary=False) as cursor:
+        cursor.execute("SELECT id FROM users ORDER BY id")
+        return [row[0] for row in cursor.fetchall()]
+
+
+@timed_query
 def get_user_by_username(username: str):
     with get_db_cursor() as cursor:
-        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+        cursor.execute(GET_USER_BY_USERNAME_SQL, (username,))
         return cursor.fetchone()
 
 
+@timed_query
 def fetch_user_expenses(user_id: int, expense_date: date):
     with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT expense_date, amount, category, notes FROM expenses WHERE expense_date = %s AND user_id = %s",
-            (expense_date, user_id)
-        )
+        cursor.execute(FETCH_USER_EXPENSES_SQL, (expense_date, user_id))
         return cursor.fetchall()
 
 
+def expenses_for_dates_query(user_id: int, fields=EXPENSE_FIELDS, start_date: date = None, end_date: date = None,
+                             dates=None):
+    """(sql, params) selecting a user's expenses for a date range or a list of dates.
+
+    fields must be a subset of EXPENSE_FIELDS; they are interpolated into the statement.
+    """
+    columns = ', '.join(('expense_date',) + tuple(field for field in fields if field in EXPENSE_FIELDS))
+    if dates is None:
+        condition, params = 'expense_date BETWEEN %s AND %s', (user_id, start_date, end_date)
+    else:
+        condition, params = f"expense_date IN ({', '.join(['%s'] * len(dates))})", (user_id, *dates)
+    sql = f'SELECT {columns} FROM expenses WHERE user_id = %s AND {condition} ORDER BY expense_date, id'
+    return sql, params
+
+
+def group_expenses_by_date(rows, days):
+    # Every requested day gets an entry, so clients can tell "no expenses" from "not fetched"
+    grouped = {day.isoformat(): [] for day in days}
+    for row in rows:
+        expense_date = row.pop('expense_date')
+        grouped.setdefault(expense_date.isoformat(), []).append(row)
+    return grouped
+
+
+@timed_query
+def fetch_user_expenses_for_dates(user_id: int, days, fields=EXPENSE_FIELDS, start_date: date = None,
+                                  end_date: date = None, dates=None):
+    logger.info('Fetching expenses for user %s on %d dates', user_id, len(days))
+    sql, params = expenses_for_dates_query(user_id, fields, start_date, end_date, dates)
+    with get_db_cursor() as cursor:
+        cursor.execute(sql, params)
+        return group_expenses_by_date(cursor.fetchall(), days)
+
+
 
 ###############################################################
+@timed_query
 def fetch_expense_for_date(expense_date):
-    logger.info('Fetching expense for date: {}'.format(expense_date))
+    logger.info('Fetching expense for date: %s', expense_date)
     with get_db_cursor() as cursor:
         cursor.execute('select * from expenses where expense_date=%s', (expense_date,))
         expenses = cursor.fetchall()
         return expenses
 
+@timed_query
 def fetch_all_user_expenses(user_id: int):
-    logger.info(f'Fetching all user expenses {user_id}')
+    logger.info('Fetching all user expenses %s', user_id)
     with get_db_cursor() as cursor:
         cursor.execute('select expense_date, amount, category, notes from expenses where user_id = %s', (user_id,))
         return cursor.fetchall()
 
+@timed_query
+def fetch_user_expenses_page(user_id: int, limit: int, after_date: date = None, after_id: int = None):
+    # Keyset pagination over (expense_date, id): each page is an index range scan, however deep it is
+    logger.info('Fetching expenses page for user %s after (%s, %s)', user_id, after_date, after_id)
+    with get_db_cursor() as cursor:
+        if after_date is None:
+            cursor.execute(FETCH_FIRST_EXPENSES_PAGE_SQL, (user_id, limit))
+        else:
+            cursor.execute(FETCH_NEXT_EXPENSES_PAGE_SQL, (user_id, after_date, after_date, after_id, limit))
+        return cursor.fetchall()
+
+
+@timed_query
+def iter_all_user_expenses(user_id: int, fetch_size: int = EXPORT_FETCH_SIZE):
+    """Yield every expense of a user as lists of EXPORT_COLUMNS tuples.
+
+    Uses an unbuffered tuple cursor, so rows are streamed from the server
+    fetch_size at a time and memory stays flat regardless of the row count.
+    """
+    logger.info('Streaming all expenses for user %s', user_id)
+    with get_db_cursor(dictionary=False) as cursor:
+        cursor.execute(EXPORT_USER_EXPENSES_SQL, (user_id,))
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+
+
+@timed_query
+def iter_user_daily_rollup(user_id: int, before: date, fetch_size: int = EXPORT_FETCH_SIZE):
+    """Yield a user's daily totals dated before that day as lists of (expense_date, total_amount, category).
+
+    Read from expense_daily_rollup, which keeps the months partitions.py has archived
+    out of expenses. Streamed like iter_all_user_expenses.
+    """
+    logger.info('Streaming daily totals for user %s before %s', user_id, before)
+    with get_db_cursor(dictionary=False) as cursor:
+        cursor.execute(DAILY_ROLLUP_BEFORE_SQL, (user_id, before))
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+
+@timed_query
 def fetch_user_expenses_by_month(user_id: int):
-    logger.info(f'Fetching monthly expenses for user {user_id}')
+    logger.info('Fetching monthly expenses for user %s', user_id)
     with get_db_cursor() as cursor:
-        cursor.execute('''select DATE_FORMAT(expense_date, '%Y-%m') AS month_year, 
-                                 SUM(amount) AS total_amount from expenses 
-                          WHERE user_id = %s
-                          GROUP BY DATE_FORMAT(expense_date, '%Y-%m')
-                          ORDER BY month_year;''', (user_id,))
+        cursor.execute(FETCH_USER_EXPENSES_BY_MONTH_SQL, (user_id,))
         expenses = cursor.fetchall()
         return expenses
 
 
+@timed_query
 def insert_expense(user_id: int, expense_date, amount, category, notes):
     with get_db_cursor(commit=True) as cursor:
-        cursor.execute(
-            "INSERT INTO expenses (user_id, expense_date, amount, category, notes) VALUES (%s, %s, %s, %s, %s)",
-            (user_id, expense_date, amount, category, notes)
-        )
+        cursor.execute(INSERT_EXPENSE_SQL, (user_id, expense_date, amount, category, notes))
+        _refresh_rollups(cursor, user_id, [expense_date])
 
 
+@timed_query
 def fetch_user_expense_summary(user_id: int, start_date: date, end_date: date):
-    logger.info(f'Fetching expense summary for user {user_id} from {start_date} to {end_date}')
+    logger.info('Fetching expense summary for user %s from %s to %s', user_id, start_date, end_date)
     with get_db_cursor() as cursor:
-        cursor.execute(
-            '''SELECT category, SUM(amount) as total 
-               FROM expenses WHERE expense_date BETWEEN %s AND %s AND user_id = %s
-               GROUP BY category;''',
-            (start_date, end_date, user_id)
-        )
+        cursor.execute(FETCH_USER_EXPENSE_SUMMARY_SQL, (user_id, start_date, end_date))
         expenses = cursor.fetchall()
         return expenses
 
+@timed_query
+def fetch_user_daily_rollup(user_id: int, start_date: date, end_date: date):
+    logger.info('Fetching daily totals for user %s from %s to %s', user_id, start_date, end_date)
+    with get_db_cursor() as cursor:
+        cursor.execute(FETCH_USER_DAILY_ROLLUP_SQL, (user_id, start_date, end_date))
+        return cursor.fetchall()
+
+@timed_query
 def delete_user_expenses_for_date(user_id: int, expense_date: date):
-    logger.info(f'Deleting expenses for user {user_id} on date: {expense_date}')
+    logger.info('Deleting expenses for user %s on date: %s', user_id, expense_date)
+    with get_db_cursor(commit=True) as cursor:
+        cursor.execute(DELETE_USER_EXPENSES_FOR_DATE_SQL, (expense_date, user_id))
+        _refresh_rollups(cursor, user_id, [expense_date])
+
+@timed_query
+def replace_user_expenses_for_date(user_id: int, expense_date: date, rows, batch_size: int = INSERT_BATCH_SIZE):
+    """Atomically replace a user's expenses for one date.
+
+    rows is an iterable of (amount, category, notes) tuples. The delete and all
+    inserts run in a single transaction, with inserts sent in executemany
+    batches of batch_size rows.
+    """
+    logger.info('Replacing expenses for user %s on date: %s', user_id, expense_date)
+    with get_db_cursor(commit=True) as cursor:
+        cursor.execute(DELETE_USER_EXPENSES_FOR_DATE_SQL, (expense_date, user_id))
+        inserted = _insert_expense_rows(
+            cursor,
+            expense_rows(user_id, expense_date, rows),
+            batch_size
+        )
+        _refresh_rollups(cursor, user_id, [expense_date])
+        return inserted
+
+
+@timed_query
+def write_expense_batch(user_id: int, rows_by_date: dict, replace_dates=(), batch_size: int = INSERT_BATCH_SIZE):
+    """Write expenses for several dates in one transaction.
+
+    rows_by_date maps a date to a list of (amount, category, notes) tuples.
+    Existing rows are deleted first for the dates in replace_dates; rows for
+    the other dates are appended.
+    """
+    logger.info('Writing %d expenses over %d dates for user %s',
+                sum(len(rows) for rows in rows_by_date.values()), len(rows_by_date), user_id)
+    with get_db_cursor(commit=True) as cursor:
+        replace_dates = sorted(replace_dates)
+        if replace_dates:
+            placeholders = ', '.join(['%s'] * len(replace_dates))
+            cursor.execute(
+                f'DELETE FROM expenses WHERE user_id=%s AND expense_date IN ({placeholders})',
+                (user_id, *replace_dates)
+            )
+        inserted = _insert_expense_rows(
+            cursor,
+            ((user_id, expense_date, amount, category, notes)
+             for expense_date, rows in rows_by_date.items()
+             for amount, category, notes in rows),
+            batch_size
+        )
+        # Replaced dates with no new rows must drop their totals too
+        _refresh_rollups(cursor, user_id, set(rows_by_date) | set(replace_dates))
+        return inserted
+
+
+def expense_rows(user_id: int, expense_date: date, rows):
+    return ((user_id, expense_date, amount, category, notes) for amount, category, notes in rows)
+
+
+def batched(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert_expense_rows(cursor, rows, batch_size):
+    inserted = 0
+    for batch in batched(rows, batch_size):
+        # mysql.connector rewrites an INSERT ... VALUES executemany into one multi-row statement
+        cursor.executemany(INSERT_EXPENSE_SQL, batch)
+        inserted += len(batch)
+    return inserted
+
+def _refresh_rollups(cursor, user_id: int, expense_dates):
+    for statement, params in rollup_refresh_statements(user_id, expense_dates):
+        cursor.execute(statement, params)
+
+
+def rollup_refresh_statements(user_id: int, expense_dates):
+    """Statements that recompute the daily and monthly rollups for the given dates of one user.
+
+    They must run inside the caller's transaction, so the rollups always commit
+    together with the expense rows they summarize. Only the touched days are
+    re-aggregated from expenses; months are re-summed from the daily rollup.
+    """
+    expense_dates = sorted({date.fromisoformat(d) if isinstance(d, str) else d for d in expense_dates})
+    if not expense_dates:
+        return []
+    placeholders = ', '.join(['%s'] * len(expense_dates))
+    statements = [
+        (f'DELETE FROM expense_daily_rollup WHERE user_id=%s AND expense_date IN ({placeholders})',
+         (user_id, *expense_dates)),
+        (f'''INSERT INTO expense_daily_rollup (user_id, expense_date, category, total_amount, expense_count)
+             SELECT user_id, expense_date, category, SUM(amount), COUNT(*)
+             FROM expenses WHERE user_id=%s AND expense_date IN ({placeholders})
+             GROUP BY user_id, expense_date, category''',
+         (user_id, *expense_dates)),
+    ]
+
+    months = sorted({expense_date.replace(day=1) for expense_date in expense_dates})
+    statements.append((
+        f'DELETE FROM expense_monthly_rollup WHERE user_id=%s AND month_year IN ({", ".join(["%s"] * len(months))})',
+        (user_id, *(month.strftime('%Y-%m') for month in months))
+    ))
+    for month_start in months:
+        next_month = (month_start + timedelta(days=31)).replace(day=1)
+        statements.append((
+            '''INSERT INTO expense_monthly_rollup (user_id, month_year, total_amount, expense_count)
+               SELECT %s, %s, SUM(total_amount), SUM(expense_count)
+               FROM expense_daily_rollup WHERE user_id=%s AND expense_date >= %s AND expense_date < %s
+               HAVING COUNT(*) > 0''',
+            (user_id, month_start.strftime('%Y-%m'), user_id, month_start, next_month)
+        ))
+    return statements
+
+
+@timed_query
+def rebuild_rollups(user_id: int = None):
+    """Rebuild the rollups from the expenses table, for backfills or after writes that bypassed db_helper.
+
+    Months older than the oldest expense left in the table are kept as they are: partitions.py
+    archives whole months out of expenses, and their totals only survive in the rollups.
+    """
+    logger.info('Rebuilding expense rollups for %s', 'all users' if user_id is None else f'user {user_id}')
+    user_filter, params = ('AND user_id=%s', (user_id,)) if user_id is not None else ('', ())
     with get_db_cursor(commit=True) as cursor:
+        cursor.execute('SELECT MIN(expense_date) AS oldest FROM expenses')
+        oldest = cursor.fetchone()['oldest']
+        if oldest is None:
+            logger.info('No expenses left to rebuild rollups from; keeping them as they are')
+            return
+        since = oldest.replace(day=1)
+
+        cursor.execute(f'DELETE FROM expense_daily_rollup WHERE expense_date >= %s {user_filter}', (since, *params))
+        cursor.execute(
+            f'DELETE FROM expense_monthly_rollup WHERE month_year >= %s {user_filter}',
+            (since.strftime('%Y-%m'), *params)
+        )
+        cursor.execute(
+            f'''INSERT INTO expense_daily_rollup (user_id, expense_date, category, total_amount, expense_count)
+                SELECT user_id, expense_date, category, SUM(amount), COUNT(*)
+                FROM expenses WHERE expense_date >= %s {user_filter}
+                GROUP BY user_id, expense_date, category''',
+            (since, *params)
+        )
+        # Index-only scan of idx_user_month_amount on the generated month_year column
         cursor.execute(
-            'DELETE FROM expenses WHERE expense_date=%s AND user_id=%s',
-            (expense_date, user_id)
+            f'''INSERT INTO expense_monthly_rollup (user_id, month_year, total_amount, expense_count)
+                SELECT user_id, month_year, SUM(amount), COUNT(*)
+                FROM expenses WHERE expense_date >= %s {user_filter}
+                GROUP BY user_id, month_year''',
+            (since, *params)
         )
 
+
 if __name__ == '__main__':
     # delete_expenses_for_date('2024-08-20')
     # fetch_expense_for_date('2024-08-20')
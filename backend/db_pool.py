@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import deque
+
+from logging_setup import setup_logger
+
+logger = setup_logger('db_pool')
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable DB connections.
+
+    Keeps up to ``size`` idle connections and allows ``max_overflow`` extra
+    connections during bursts; those are closed on release instead of being
+    kept. Idle connections older than ``idle_timeout`` are evicted, and a
+    connection that sat idle for more than ``ping_interval`` is health-checked
+    before it is handed out.
+    """
+
+    def __init__(self, connect, ping=None, size=5, max_overflow=5, timeout=10.0,
+                 idle_timeout=300.0, ping_interval=30.0):
+        self._connect = connect
+        self._ping = ping or (lambda conn: conn.is_connected())
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, last_used); right end is the most recently used
+        self._open = 0
+        self._checked_out = 0
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'evicted': 0,
+            'health_check_failures': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'overflow_max': 0,
+        }
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            expired = self._pop_expired()
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f'No connection available after {self.timeout}s '
+                        f'(size={self.size}, max_overflow={self.max_overflow})'
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            self._checked_out += 1
+            wait_time = time.monotonic() - start
+            self._stats['checkouts'] += 1
+            self._stats['waits'] += waited
+            self._stats['wait_time_total'] += wait_time
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+            self._stats['overflow_max'] = max(self._stats['overflow_max'], self._open - self.size)
+
+        self._close_all(expired)
+
+        if conn is not None and time.monotonic() - last_used > self.ping_interval and not self._is_healthy(conn):
+            with self._cond:
+                self._stats['health_check_failures'] += 1
+            logger.warning('Discarding stale pooled connection that failed its health check')
+            self._close(conn)
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except BaseException:
+                with self._cond:
+                    self._open -= 1
+                    self._checked_out -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            self._checked_out -= 1
+            keep = not discard and len(self._idle) < self.size
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._open -= 1
+            expired = self._pop_expired()
+            self._cond.notify()
+        if not keep:
+            self._close(conn)
+        self._close_all(expired)
+
+    def close(self):
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._open -= len(idle)
+        self._close_all(idle)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                size=self.size,
+                max_overflow=self.max_overflow,
+                open=self._open,
+                idle=len(self._idle),
+                checked_out=self._checked_out,
+                overflow=max(self._open - self.size, 0),
+            )
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+    def _pop_expired(self):
+        # Called with the lock held; the oldest idle connections sit on the left.
+        expired = []
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < cutoff:
+            expired.append(self._idle.popleft()[0])
+        self._open -= len(expired)
+        self._stats['evicted'] += len(expired)
+        return expired
+
+    def _is_healthy(self, conn):
+        try:
+            return bool(self._ping(conn))
+        except Exception:
+            return False
+
+    def _close_all(self, conns):
+        for conn in conns:
+            self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning('Error closing pooled connection: %s', e)
+        with self._cond:
+            self._stats['closed'] += 1
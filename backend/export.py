@@ -0,0 +1,86 @@
+import csv
+import io
+
+from fast_json import dumps
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def ndjson_chunks(columns, batches):
+    for rows in batches:
+        yield b''.join(dumps(dict(zip(columns, row))) + b'\n' for row in rows)
+
+
+def csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _StreamSink(io.RawIOBase):
+    # Write-only file that hands back what was written since the last drain(). tell() keeps
+    # counting across drains because the Parquet footer records absolute offsets.
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_chunks(columns, batches):
+    # Each batch becomes one row group, so only a single batch is ever held in memory
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('expense_date', pa.date32()),
+        ('amount', pa.decimal128(10, 2)),
+        ('category', pa.string()),
+        ('notes', pa.string()),
+    ])
+    if list(columns) != schema.names:
+        raise ValueError(f'Unexpected export columns: {columns}')
+
+    sink = _StreamSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in batches:
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+
+WRITERS = {
+    'ndjson': ndjson_chunks,
+    'csv': csv_chunks,
+    'parquet': parquet_chunks,
+}
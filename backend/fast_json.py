@@ -0,0 +1,26 @@
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(value):
+    # orjson handles date/datetime natively; DECIMAL columns come back as Decimal
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson.
+
+    Returning one from a handler also skips FastAPI's jsonable_encoder and response_model
+    validation, which cost more than the encoding itself for large row lists.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,149 @@
+import csv
+import json
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+NDJSON_TYPES = {'application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json-lines'}
+CSV_TYPES = {'text/csv', 'application/csv'}
+CSV_COLUMNS = ['expense_date', 'amount', 'category', 'notes']
+
+
+class IngestError(ValueError):
+    def __init__(self, line_number, message):
+        super().__init__(f'line {line_number}: {message}')
+        self.line_number = line_number
+
+
+def body_format(content_type: str):
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        return 'ndjson'
+    if media_type in CSV_TYPES:
+        return 'csv'
+    return None
+
+
+async def iter_lines(chunks):
+    # Split an async stream of byte chunks into lines without buffering the whole body
+    buffer = b''
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            line_number += 1
+            yield line_number, line.rstrip(b'\r').decode('utf-8')
+    if buffer:
+        yield line_number + 1, buffer.rstrip(b'\r').decode('utf-8')
+
+
+async def iter_records(chunks, fmt: str):
+    """Yield (line_number, expense_date, (amount, category, notes)) from an NDJSON or CSV body."""
+    if fmt == 'ndjson':
+        async for line_number, line in iter_lines(chunks):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise IngestError(line_number, f'invalid JSON ({e.msg})')
+            if not isinstance(record, dict):
+                raise IngestError(line_number, 'expected a JSON object')
+            yield (line_number,) + parse_record(record, line_number)
+    elif fmt == 'csv':
+        header = None
+        pending, start = '', 0
+        async for line_number, line in iter_lines(chunks):
+            # A quoted field may span lines; keep reading until the quotes balance
+            if not pending:
+                start = line_number
+            pending = f'{pending}\n{line}' if pending else line
+            if pending.count('"') % 2:
+                continue
+            text, pending = pending, ''
+            if not text.strip():
+                continue
+            values = next(csv.reader([text]))
+            if header is None:
+                header = [column.strip().lower() for column in values]
+                missing = [column for column in CSV_COLUMNS[:3] if column not in header]
+                if missing:
+                    raise IngestError(start, f'CSV header is missing columns: {", ".join(missing)}')
+                continue
+            if len(values) != len(header):
+                raise IngestError(start, f'expected {len(header)} fields, got {len(values)}')
+            yield (start,) + parse_record(dict(zip(header, values)), start)
+        if pending:
+            raise IngestError(start, 'unterminated quoted field')
+    else:
+        raise ValueError(f'Unsupported ingest format: {fmt}')
+
+
+def parse_record(record: dict, line_number: int):
+    try:
+        expense_date = date.fromisoformat(str(record['expense_date']).strip())
+    except KeyError:
+        raise IngestError(line_number, 'missing expense_date')
+    except ValueError:
+        raise IngestError(line_number, f'invalid expense_date {record["expense_date"]!r}')
+
+    try:
+        amount = Decimal(str(record['amount']).strip())
+    except KeyError:
+        raise IngestError(line_number, 'missing amount')
+    except InvalidOperation:
+        raise IngestError(line_number, f'invalid amount {record["amount"]!r}')
+    if not amount.is_finite() or amount < 0:
+        raise IngestError(line_number, f'invalid amount {record["amount"]!r}')
+
+    category = str(record.get('category') or '').strip()
+    if not category:
+        raise IngestError(line_number, 'missing category')
+    notes = record.get('notes')
+    notes = '' if notes is None else str(notes)
+    return expense_date, (amount, category, notes)
+
+
+async def ingest_records(records, write_batch, batch_rows: int):
+    """Group streamed records by date and hand them to write_batch in bounded batches.
+
+    write_batch(rows_by_date, replace_dates) is awaited once per batch and must
+    write the batch in one transaction. A date is replaced (its existing rows
+    deleted) the first time it appears and appended to afterwards, so
+    re-running the same import is idempotent.
+    """
+    started = time.monotonic()
+    counts = {}
+    replaced = set()
+    pending = {}
+    pending_rows = 0
+    batches = 0
+
+    async def flush():
+        nonlocal pending, pending_rows, batches
+        replace_dates = set(pending) - replaced
+        await write_batch(pending, replace_dates)
+        replaced.update(replace_dates)
+        for expense_date, rows in pending.items():
+            counts[expense_date] = counts.get(expense_date, 0) + len(rows)
+        batches += 1
+        pending, pending_rows = {}, 0
+
+    async for _, expense_date, row in records:
+        pending.setdefault(expense_date, []).append(row)
+        pending_rows += 1
+        if pending_rows >= batch_rows:
+            await flush()
+    if pending:
+        await flush()
+
+    elapsed = time.monotonic() - started
+    total = sum(counts.values())
+    return {
+        'rows': total,
+        'dates': {expense_date.isoformat(): count for expense_date, count in sorted(counts.items())},
+        'batches': batches,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(total / elapsed, 1) if elapsed > 0 else None,
+    }
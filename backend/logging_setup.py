@@ -1,14 +1,90 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json or text
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+# Fraction of DEBUG records that are kept; INFO and above are never sampled
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 0.1))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Attributes every LogRecord has; anything else was passed through extra= and is logged as a field
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listeners = {}  # logfile -> (queue, listener)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class LazyQueueHandler(QueueHandler):
+    # QueueHandler.prepare() formats the message on the calling thread; hand the record
+    # over untouched instead, so %-style arguments are only formatted by the listener
+    def prepare(self, record):
+        return record
+
+
+def _listener_queue(logfile):
+    if logfile not in _listeners:
+        file_handler = RotatingFileHandler(logfile, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+        file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+        records = queue.SimpleQueue()
+        listener = QueueListener(records, file_handler, respect_handler_level=True)
+        listener.start()
+        _listeners[logfile] = (records, listener)
+    return _listeners[logfile][0]
+
+
+@atexit.register
+def stop_listeners():
+    """Write out what is still queued and stop the listener threads."""
+    while _listeners:
+        _, (_, listener) = _listeners.popitem()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
 
 def setup_logger(name, logfile='server.log'):
-    # Create a custom logger
-    logger = logging.getLogger (name)
-
-    # Configure the custom logger
-    logger.setLevel(logging.DEBUG)
-    file_handler = logging. FileHandler(logfile)
-    formatter = logging.Formatter ('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter (formatter)
-    logger.addHandler (file_handler)
+    """Logger that hands records to a background thread writing a size-rotated file.
+
+    Request threads only enqueue; formatting and disk I/O happen on the listener thread.
+    Calling it again for the same name returns the logger without adding handlers.
+    """
+    logger = logging.getLogger(name)
+    if any(getattr(handler, 'expense_log_handler', False) for handler in logger.handlers):
+        return logger
+
+    logger.setLevel(LOG_LEVEL)
+    handler = LazyQueueHandler(_listener_queue(logfile))
+    handler.expense_log_handler = True
+    handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+    logger.addHandler(handler)
 
     return logger
@@ -0,0 +1,233 @@
+import functools
+import inspect
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, SummaryMetricFamily
+
+from tracing import route_template, tracer
+
+# With several gunicorn/uvicorn workers set PROMETHEUS_MULTIPROC_DIR to an empty directory shared
+# by them, so /metrics aggregates every worker's histograms rather than those of the one answering
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+registry = CollectorRegistry(auto_describe=True)
+_stats_collectors = []
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to send the full response, by route template',
+    ['method', 'route', 'status'], registry=registry
+)
+QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'Wall time of a db_helper/async_db_helper call, checkout included',
+    ['module', 'function'], registry=registry,
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+QUERY_ROWS = Histogram(
+    'db_query_rows', 'Rows returned by a db_helper/async_db_helper call',
+    ['module', 'function'], registry=registry,
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+)
+QUERY_ERRORS = Counter(
+    'db_query_errors', 'db_helper/async_db_helper calls that raised', ['module', 'function'], registry=registry
+)
+POOL_WAIT = Histogram(
+    'db_pool_wait_seconds', 'Time to check a connection out of a pool, connecting included',
+    ['pool'], registry=registry,
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+
+def count_rows(result):
+    """Rows in what a helper returned: rows, one row (dict), rows grouped by date or rows written."""
+    if result is None:
+        return 0
+    if isinstance(result, dict):
+        values = list(result.values())
+        if values and all(isinstance(value, list) for value in values):
+            return sum(len(value) for value in values)
+        return 1
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, int) and not isinstance(result, bool):
+        return result
+    return None  # flags and other scalars: nothing to record
+
+
+def _observe(labels, started, result):
+    QUERY_LATENCY.labels(*labels).observe(time.perf_counter() - started)
+    rows = count_rows(result)
+    if rows is not None:
+        QUERY_ROWS.labels(*labels).observe(rows)
+
+
+def timed_query(func):
+    """Record the latency and row count of a db_helper/async_db_helper function, in a span of its own.
+
+    Generators yielding batches of rows are timed until exhausted or closed, and their
+    row count is the sum of the batch sizes.
+    """
+    labels = (func.__module__, func.__name__)
+    span_name = f'{func.__module__}.{func.__name__}'
+    attributes = {'db.system': 'mysql'}
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with tracer.start_as_current_span(span_name, attributes=attributes):
+                    result = await func(*args, **kwargs)
+            except BaseException:
+                QUERY_ERRORS.labels(*labels).inc()
+                raise
+            _observe(labels, started, result)
+            return result
+    elif inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            rows = 0
+            # Not made current: the context would leak into the consumer between batches
+            span = tracer.start_span(span_name, attributes=attributes)
+            try:
+                for batch in func(*args, **kwargs):
+                    rows += len(batch)
+                    yield batch
+            except BaseException as e:
+                if not isinstance(e, GeneratorExit):
+                    QUERY_ERRORS.labels(*labels).inc()
+                    span.record_exception(e)
+                raise
+            finally:
+                QUERY_LATENCY.labels(*labels).observe(time.perf_counter() - started)
+                QUERY_ROWS.labels(*labels).observe(rows)
+                span.set_attribute('db.rows', rows)
+                span.end()
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with tracer.start_as_current_span(span_name, attributes=attributes):
+                    result = func(*args, **kwargs)
+            except BaseException:
+                QUERY_ERRORS.labels(*labels).inc()
+                raise
+            _observe(labels, started, result)
+            return result
+    return wrapper
+
+
+class StatsCollector:
+    """Exports the stats() counters the pools, caches and password hasher already keep.
+
+    They are read at scrape time, so the hot paths pay nothing extra. Each argument is a
+    callable returning the stats dict; caches maps a cache name to one.
+    """
+
+    def __init__(self, pool_stats=None, hasher_stats=None, caches=None):
+        self.pool_stats = pool_stats
+        self.hasher_stats = hasher_stats
+        self.caches = caches or {}
+
+    def collect(self):
+        if self.pool_stats is not None:
+            yield from self._pool_metrics(self.pool_stats())
+        if self.hasher_stats is not None:
+            yield from self._hasher_metrics(self.hasher_stats())
+        if self.caches:
+            yield from self._cache_metrics({name: stats() for name, stats in self.caches.items()})
+
+    @staticmethod
+    def _pool_metrics(stats):
+        connections = GaugeMetricFamily('db_pool_connections', 'Connections of the db_helper pool by state',
+                                        labels=['state'])
+        for state in ('open', 'idle', 'checked_out'):
+            connections.add_metric([state], stats[state])
+        yield connections
+        for key, help_text in (('checkouts', 'Connections handed out'),
+                               ('waits', 'Checkouts that had to wait for a free connection'),
+                               ('timeouts', 'Checkouts that gave up after DB_POOL_TIMEOUT'),
+                               ('created', 'Connections opened'),
+                               ('health_check_failures', 'Idle connections discarded by their health check')):
+            yield CounterMetricFamily(f'db_pool_{key}', help_text, value=stats[key])
+
+    @staticmethod
+    def _hasher_metrics(stats):
+        operations = stats['hashes'] + stats['verifies']
+        yield SummaryMetricFamily('password_hash_seconds', 'bcrypt time per hash or verification',
+                                  count_value=operations, sum_value=stats['hash_time_total'])
+        yield SummaryMetricFamily('password_hash_queue_seconds', 'Time a hash waited for a bcrypt thread',
+                                  count_value=operations, sum_value=stats['queue_time_total'])
+        yield GaugeMetricFamily('password_hash_in_flight', 'Hashes queued or running', value=stats['in_flight'])
+        yield CounterMetricFamily('password_hash_rejected', 'Hashes refused because the queue was full',
+                                  value=stats['rejected'])
+        yield CounterMetricFamily('password_rehashes', 'Stored hashes upgraded to the current cost',
+                                  value=stats['rehashes'])
+
+    @staticmethod
+    def _cache_metrics(caches):
+        # Hit rate: rate(cache_hits_total[5m]) / (rate(cache_hits_total[5m]) + rate(cache_misses_total[5m]))
+        for key, help_text in (('hits', 'Cache lookups answered from the cache'),
+                               ('misses', 'Cache lookups that went to the loader'),
+                               ('invalidations', 'Entries dropped by per-user invalidation')):
+            family = CounterMetricFamily(f'cache_{key}', help_text, labels=['cache'])
+            for name, stats in caches.items():
+                family.add_metric([name], stats.get(key, 0))
+            yield family
+        entries = GaugeMetricFamily('cache_entries', 'Entries held by in-process caches', labels=['cache'])
+        for name, stats in caches.items():
+            if 'entries' in stats:
+                entries.add_metric([name], stats['entries'])
+        yield entries
+
+
+class MetricsMiddleware:
+    """Observes every HTTP request in http_request_duration_seconds."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_LATENCY.labels(scope['method'], route_template(scope), str(status)).observe(
+                time.perf_counter() - started
+            )
+
+
+def register_stats(collector):
+    registry.register(collector)
+    _stats_collectors.append(collector)
+
+
+def exposition():
+    """(body, content type) of a scrape.
+
+    In multiprocess mode the histograms cover every worker, while stats collectors still
+    describe the process answering the scrape.
+    """
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        scrape = CollectorRegistry()
+        multiprocess.MultiProcessCollector(scrape)
+        for collector in _stats_collectors:
+            scrape.register(collector)
+        return generate_latest(scrape), CONTENT_TYPE_LATEST
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,57 @@
+"""Covering indexes and generated month column for the hot queries
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-09-20 10:05:00
+
+- idx_user_date (user_id, expense_date): per-day reads, deletes and keyset
+  pagination; InnoDB appends the primary key, so ORDER BY expense_date, id
+  is read in index order.
+- idx_user_date_category_amount: covers the per-day category aggregation
+  that maintains expense_daily_rollup.
+- month_year: virtual generated column ('YYYY-MM') with
+  idx_user_month_amount, so monthly totals are an index-only scan instead
+  of a DATE_FORMAT() over every row. Virtual columns are added in place
+  without rebuilding the table.
+
+Indexes that already exist (e.g. created by hand from the README) are skipped.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EXPENSE_INDEXES = {
+    'idx_user_date': ['user_id', 'expense_date'],
+    'idx_user_date_category_amount': ['user_id', 'expense_date', 'category', 'amount'],
+    'idx_user_month_amount': ['user_id', 'month_year', 'amount'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if 'month_year' not in {column['name'] for column in inspector.get_columns('expenses')}:
+        op.execute(
+            "ALTER TABLE expenses ADD COLUMN month_year CHAR(7) "
+            "GENERATED ALWAYS AS (LEFT(CAST(expense_date AS CHAR(10)), 7)) VIRTUAL"
+        )
+
+    existing = {index['name'] for index in inspector.get_indexes('expenses')}
+    for name, columns in EXPENSE_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'expenses', columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # idx_user_date predates migrations in most deployments, so it is kept
+    op.drop_index('idx_user_month_amount', table_name='expenses')
+    op.drop_index('idx_user_date_category_amount', table_name='expenses')
+    op.drop_column('expenses', 'month_year')
@@ -0,0 +1,46 @@
+"""Daily and monthly rollup tables
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-09-20 10:10:00
+
+After upgrading an existing database, backfill with db_helper.rebuild_rollups().
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS expense_daily_rollup (
+            user_id INT NOT NULL,
+            expense_date DATE NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            total_amount DECIMAL(14, 2) NOT NULL,
+            expense_count INT NOT NULL,
+            PRIMARY KEY (user_id, expense_date, category)
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS expense_monthly_rollup (
+            user_id INT NOT NULL,
+            month_year CHAR(7) NOT NULL,
+            total_amount DECIMAL(14, 2) NOT NULL,
+            expense_count INT NOT NULL,
+            PRIMARY KEY (user_id, month_year)
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('expense_monthly_rollup')
+    op.drop_table('expense_daily_rollup')
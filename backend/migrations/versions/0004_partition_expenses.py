@@ -0,0 +1,66 @@
+"""Partition expenses by month of expense_date
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-09-22 09:00:00
+
+RANGE COLUMNS partitioning lets MySQL prune every partition outside the
+expense_date range of a query. MySQL requires the partitioning column in every
+unique key, so the primary key becomes (id, expense_date), and partitioned
+InnoDB tables cannot have foreign keys, so expenses.user_id loses its FK to
+users (db_helper never deletes users, so ON DELETE CASCADE was unused).
+
+One partition is created per month from the oldest expense to three months
+ahead, plus a catch-all p_future. Run `python partitions.py` from cron to keep
+creating future partitions and optionally archive old ones.
+
+Partitioning rebuilds the table; on large tables run it in a maintenance window.
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    for foreign_key in sa.inspect(bind).get_foreign_keys('expenses'):
+        op.drop_constraint(foreign_key['name'], 'expenses', type_='foreignkey')
+    op.execute("ALTER TABLE expenses DROP PRIMARY KEY, ADD PRIMARY KEY (id, expense_date)")
+
+    oldest = bind.execute(sa.text("SELECT MIN(expense_date) FROM expenses")).scalar()
+    month = (oldest or date.today()).replace(day=1)
+    last = _add_months(date.today().replace(day=1), MONTHS_AHEAD)
+    definitions = []
+    while month <= last:
+        upper = _add_months(month, 1)
+        definitions.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{upper:%Y-%m-%d}')")
+        month = upper
+    definitions.append("PARTITION p_future VALUES LESS THAN (MAXVALUE)")
+    op.execute(
+        "ALTER TABLE expenses PARTITION BY RANGE COLUMNS (expense_date) (\n    "
+        + ",\n    ".join(definitions)
+        + "\n)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE expenses REMOVE PARTITIONING")
+    op.execute("ALTER TABLE expenses DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    op.create_foreign_key(None, 'expenses', 'users', ['user_id'], ['id'], ondelete='CASCADE')
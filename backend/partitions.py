@@ -0,0 +1,123 @@
+import argparse
+from datetime import date
+
+from logging_setup import setup_logger
+
+logger = setup_logger('partitions')
+
+TABLE = 'expenses'
+FUTURE_PARTITION = 'p_future'
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'p{month:%Y%m}'
+
+
+def monthly_partitions(first_month: date, last_month: date):
+    """(name, exclusive upper bound) for every month from first_month to last_month inclusive."""
+    partitions = []
+    month = month_start(first_month)
+    while month <= last_month:
+        partitions.append((partition_name(month), add_months(month, 1)))
+        month = add_months(month, 1)
+    return partitions
+
+
+def partition_definitions(partitions, with_future=True):
+    definitions = [f"PARTITION {name} VALUES LESS THAN ('{upper:%Y-%m-%d}')" for name, upper in partitions]
+    if with_future:
+        definitions.append(f'PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)')
+    return ',\n    '.join(definitions)
+
+
+def list_partitions(cursor):
+    """Monthly partitions of expenses as (name, upper bound date), oldest first."""
+    cursor.execute(
+        '''SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS upper_bound
+           FROM information_schema.PARTITIONS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+           ORDER BY PARTITION_ORDINAL_POSITION''',
+        (TABLE,)
+    )
+    partitions = []
+    for row in cursor.fetchall():
+        if row['name'] != FUTURE_PARTITION:
+            partitions.append((row['name'], date.fromisoformat(row['upper_bound'].strip("'"))))
+    return partitions
+
+
+def ensure_future_partitions(cursor, months_ahead=3, today=None):
+    """Split p_future so that every month up to months_ahead from today has its own partition."""
+    current = month_start(today or date.today())
+    existing = list_partitions(cursor)
+    if not existing:
+        raise RuntimeError(f'{TABLE} is not partitioned by month; run the migrations first')
+
+    first_missing = existing[-1][1]  # upper bound of the newest partition is the next month's start
+    new_partitions = monthly_partitions(first_missing, add_months(current, months_ahead))
+    if not new_partitions:
+        return []
+    logger.info('Adding partitions %s..%s to %s', new_partitions[0][0], new_partitions[-1][0], TABLE)
+    cursor.execute(
+        f'ALTER TABLE {TABLE} REORGANIZE PARTITION {FUTURE_PARTITION} INTO (\n    '
+        f'{partition_definitions(new_partitions)}\n)'
+    )
+    return [name for name, _ in new_partitions]
+
+
+def archive_partitions(cursor, keep_months=24, today=None, drop_only=False):
+    """Move monthly partitions older than keep_months out of expenses.
+
+    Each old partition is swapped into its own expenses_archive_pYYYYMM table with
+    EXCHANGE PARTITION (a metadata-only operation) and then dropped, or simply dropped
+    when drop_only is set. The rollup tables keep the totals of archived months (also
+    across db_helper.rebuild_rollups(), which starts at the oldest month left), but archived
+    days must not be edited afterwards: a rewrite would re-aggregate them from the
+    now-empty partition.
+    """
+    cutoff = add_months(month_start(today or date.today()), -keep_months)
+    archived = []
+    for name, upper in list_partitions(cursor):
+        if upper > cutoff:
+            break
+        if not drop_only:
+            archive_table = f'{TABLE}_archive_{name}'
+            logger.info('Archiving partition %s of %s into %s', name, TABLE, archive_table)
+            cursor.execute(f'CREATE TABLE {archive_table} LIKE {TABLE}')
+            cursor.execute(f'ALTER TABLE {archive_table} REMOVE PARTITIONING')
+            cursor.execute(f'ALTER TABLE {TABLE} EXCHANGE PARTITION {name} WITH TABLE {archive_table}')
+        logger.info('Dropping partition %s of %s', name, TABLE)
+        cursor.execute(f'ALTER TABLE {TABLE} DROP PARTITION {name}')
+        archived.append(name)
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the monthly partitions of the expenses table.')
+    parser.add_argument('--months-ahead', type=int, default=3,
+                        help='create partitions up to this many months after the current one')
+    parser.add_argument('--archive-after-months', type=int, default=None,
+                        help='archive partitions older than this many months (disabled by default)')
+    parser.add_argument('--drop', action='store_true', help='drop old partitions instead of archiving them')
+    args = parser.parse_args()
+
+    import db_helper
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        added = ensure_future_partitions(cursor, args.months_ahead)
+        print(f'Added partitions: {", ".join(added) or "none"}')
+        if args.archive_after_months is not None:
+            archived = archive_partitions(cursor, args.archive_after_months, drop_only=args.drop)
+            print(f'Archived partitions: {", ".join(archived) or "none"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+
+class HashingBusyError(Exception):
+    pass
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, size-limited thread pool.
+
+    bcrypt releases the GIL while hashing, so a few threads keep the CPU busy
+    without stalling request threads. At most ``queue_limit`` hashes may be
+    queued or running; beyond that submit() fails fast with HashingBusyError
+    so callers can shed load instead of piling up.
+    """
+
+    def __init__(self, rounds=12, workers=2, queue_limit=64):
+        self.rounds = rounds
+        self.queue_limit = queue_limit
+        # Pinning min/max to the configured cost makes needs_update() flag hashes made
+        # with any other cost, so they are rehashed on the next successful login
+        self.context = CryptContext(
+            schemes=["bcrypt"], deprecated="auto",
+            bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds
+        )
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._lock = threading.Lock()
+        self._stats = {
+            'hashes': 0,
+            'verifies': 0,
+            'rehashes': 0,
+            'rejected': 0,
+            'in_flight': 0,
+            'hash_time_total': 0.0,
+            'hash_time_max': 0.0,
+            'queue_time_total': 0.0,
+        }
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HashingBusyError(f'Password hashing queue is full ({self.queue_limit} pending)')
+        with self._lock:
+            self._stats['in_flight'] += 1
+        try:
+            return self._executor.submit(self._timed, time.monotonic(), fn, *args)
+        except BaseException:
+            self._done()
+            raise
+
+    def hash(self, password: str) -> str:
+        return self.submit(self._hash, password).result()
+
+    def verify(self, password: str, hashed_password: str):
+        """Return (matches, new_hash); new_hash is set when the stored hash uses an outdated cost."""
+        return self.submit(self._verify, password, hashed_password).result()
+
+    async def ahash(self, password: str) -> str:
+        return await asyncio.wrap_future(self.submit(self._hash, password))
+
+    async def averify(self, password: str, hashed_password: str):
+        return await asyncio.wrap_future(self.submit(self._verify, password, hashed_password))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        operations = stats['hashes'] + stats['verifies']
+        stats['hash_time_avg'] = stats['hash_time_total'] / operations if operations else 0.0
+        stats['queue_time_avg'] = stats['queue_time_total'] / operations if operations else 0.0
+        stats.update(rounds=self.rounds, queue_limit=self.queue_limit)
+        return stats
+
+    def _hash(self, password):
+        hashed = self.context.hash(password)
+        with self._lock:
+            self._stats['hashes'] += 1
+        return hashed
+
+    def _verify(self, password, hashed_password):
+        matches, new_hash = self.context.verify_and_update(password, hashed_password)
+        with self._lock:
+            self._stats['verifies'] += 1
+            self._stats['rehashes'] += new_hash is not None
+        return matches, new_hash
+
+    def _timed(self, submitted_at, fn, *args):
+        started = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._stats['queue_time_total'] += started - submitted_at
+                self._stats['hash_time_total'] += elapsed
+                self._stats['hash_time_max'] = max(self._stats['hash_time_max'], elapsed)
+            self._done()
+
+    def _done(self):
+        with self._lock:
+            self._stats['in_flight'] -= 1
+        self._slots.release()
@@ -0,0 +1,63 @@
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+
+import jwt as pyjwt
+from jose import jwt, JWTError
+
+from cache import MISS, TTLCache
+
+SECRET_KEY = "super_secret_key"  # put in .env
+ALGORITHM = "HS256"
+JWT_BACKEND = os.getenv('JWT_BACKEND', 'jose')
+
+# Verified payloads keyed by token digest; an entry never outlives the token's own exp
+token_cache = TTLCache(
+    maxsize=int(os.getenv('TOKEN_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('TOKEN_CACHE_TTL_SECONDS', 300))
+)
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+def create_access_token(data: dict, expires_delta: timedelta = None):
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_jose(token: str):
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        raise InvalidTokenError(str(e))
+
+
+def decode_pyjwt(token: str):
+    try:
+        return pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except pyjwt.PyJWTError as e:
+        raise InvalidTokenError(str(e))
+
+
+DECODERS = {
+    'jose': decode_jose,
+    'pyjwt': decode_pyjwt,
+}
+
+
+def verify_token(token: str, decode=DECODERS[JWT_BACKEND]):
+    key = (hashlib.sha256(token.encode()).digest(),)
+    payload = token_cache.get(key)
+    if payload is not MISS:
+        return payload
+
+    payload = decode(token)
+    remaining = payload.get("exp", 0) - time.time()
+    if remaining > 0:
+        token_cache.set(key, payload, ttl=min(remaining, token_cache.ttl))
+    return payload
@@ -0,0 +1,93 @@
+import os
+
+from opentelemetry import propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from logging_setup import setup_logger
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'false').lower() == 'true'
+# Finished spans are appended as one JSON object per line, so tracing works without a collector
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+# Share of new traces that are recorded; requests arriving with a traceparent follow its decision
+TRACE_SAMPLE_RATIO = float(os.getenv('TRACE_SAMPLE_RATIO', 1.0))
+
+logger = setup_logger('tracing')
+
+# Until configure() installs a provider this is a no-op tracer, so instrumented code costs next to nothing
+tracer = trace.get_tracer('expense-api')
+_provider = None
+
+# Routes are named by template (/expenses/batch, not the raw path); anything unrouted
+# shares one name so scanners cannot blow up metric labels
+UNMATCHED_ROUTE = 'unmatched'
+_routes = {}  # endpoint -> route template
+
+
+def configure(service_name='expense-api'):
+    """Install the SDK tracer provider with the file exporter, once, if TRACING_ENABLED."""
+    global _provider
+    if not TRACING_ENABLED or _provider is not None:
+        return _provider
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    _provider = TracerProvider(
+        resource=Resource.create({'service.name': service_name}),
+        sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO)),
+    )
+    exporter = ConsoleSpanExporter(
+        out=open(TRACE_FILE, 'a', encoding='utf-8'),
+        formatter=lambda span: span.to_json(indent=None) + '\n',
+    )
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    logger.info('Tracing %s to %s (sample ratio %s)', service_name, TRACE_FILE, TRACE_SAMPLE_RATIO)
+    return _provider
+
+
+def route_template(scope):
+    """Path template of the route that handled an ASGI request, once routing has run."""
+    # The router stores the matched endpoint in the scope; map it back to its path template
+    endpoint = scope.get('endpoint')
+    if endpoint is None:
+        return UNMATCHED_ROUTE
+    if endpoint not in _routes:
+        paths = [route.path for route in scope['app'].routes if getattr(route, 'endpoint', None) is endpoint]
+        _routes[endpoint] = paths[0] if paths else UNMATCHED_ROUTE
+    return _routes[endpoint]
+
+
+class TracingMiddleware:
+    """Opens a server span per HTTP request, continuing the caller's trace from its traceparent header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+        with tracer.start_as_current_span(
+            scope['method'],
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={'http.request.method': scope['method'], 'url.path': scope['path']},
+        ) as span:
+            async def send_with_status(message):
+                if message['type'] == 'http.response.start':
+                    span.set_attribute('http.response.status_code', message['status'])
+                    if message['status'] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = route_template(scope)
+                span.set_attribute('http.route', route)
+                span.update_name(f"{scope['method']} {route}")
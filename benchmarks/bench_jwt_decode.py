@@ -0,0 +1,33 @@
+"""Micro-benchmark of the token verification paths used by SERVER.get_current_user.
+
+Run from the repository root:
+    python benchmarks/bench_jwt_decode.py
+"""
+import os
+import sys
+import timeit
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import tokens  # noqa: E402
+
+NUMBER = 20000
+
+
+def main():
+    token = tokens.create_access_token({"sub": "bench", "id": 1}, timedelta(minutes=60))
+    tokens.verify_token(token)  # warm the cache
+
+    paths = {
+        'python-jose decode': lambda: tokens.decode_jose(token),
+        'PyJWT decode': lambda: tokens.decode_pyjwt(token),
+        'verify_token (cached)': lambda: tokens.verify_token(token),
+    }
+    for name, fn in paths.items():
+        best = min(timeit.repeat(fn, number=NUMBER, repeat=5)) / NUMBER
+        print(f'{name:<24} {best * 1e6:8.2f} us/op')
+
+
+if __name__ == '__main__':
+    main()
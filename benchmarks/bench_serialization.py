@@ -0,0 +1,81 @@
+"""Micro-benchmark of response encoding cost per 10k expense rows.
+
+Compares FastAPI's default path (jsonable_encoder, plus response_model validation for
+/expenses/) with FastJSONResponse, the stdlib and orjson NDJSON export writers, and the
+cost of compressing the result. Run from the repository root:
+    python benchmarks/bench_serialization.py
+"""
+import gzip
+import json
+import os
+import sys
+import timeit
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import BaseModel, TypeAdapter  # noqa: E402
+
+import export  # noqa: E402
+from fast_json import FastJSONResponse  # noqa: E402
+
+ROWS = 10000
+REPEAT = 5
+
+
+class Expense(BaseModel):
+    amount: float
+    category: str
+    notes: str
+
+
+def make_rows():
+    start = date(2024, 1, 1)
+    return [
+        (i, start + timedelta(days=i % 365), Decimal(f'{i % 5000}.{i % 100:02d}'), 'Food', f'note {i}')
+        for i in range(ROWS)
+    ]
+
+
+def stdlib_ndjson(columns, rows):
+    def default(value):
+        if isinstance(value, Decimal):
+            return float(value)
+        return value.isoformat()
+    return ''.join(json.dumps(dict(zip(columns, row)), default=default) + '\n' for row in rows).encode('utf-8')
+
+
+def main():
+    columns = ('id', 'expense_date', 'amount', 'category', 'notes')
+    rows = make_rows()
+    dicts = [dict(zip(columns, row)) for row in rows]
+    expenses = TypeAdapter(List[Expense])
+    body = FastJSONResponse(dicts).body
+
+    paths = {
+        'jsonable_encoder + json': lambda: json.dumps(jsonable_encoder(dicts)).encode('utf-8'),
+        'response_model + json': lambda: json.dumps(
+            jsonable_encoder(expenses.validate_python(dicts))).encode('utf-8'),
+        'FastJSONResponse': lambda: FastJSONResponse(dicts).body,
+        'NDJSON export (json)': lambda: stdlib_ndjson(columns, rows),
+        'NDJSON export (orjson)': lambda: b''.join(export.ndjson_chunks(columns, [rows])),
+        'gzip level 6': lambda: gzip.compress(body, compresslevel=6),
+        'gzip level 9': lambda: gzip.compress(body, compresslevel=9),
+    }
+    try:
+        import brotli
+        paths['brotli quality 4'] = lambda: brotli.compress(body, quality=4)
+    except ImportError:
+        pass
+
+    print(f'{ROWS} rows, {len(body)} bytes of JSON, {len(gzip.compress(body, 6))} gzipped')
+    for name, fn in paths.items():
+        best = min(timeit.repeat(fn, number=1, repeat=REPEAT))
+        print(f'{name:<26} {best * 1e3:8.2f} ms per {ROWS} rows')
+
+
+if __name__ == '__main__':
+    main()
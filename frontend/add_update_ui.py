@@ -1,19 +1,21 @@
 import streamlit as st
-import requests
+import api_client
 from datetime import datetime
 
-API_url = "http://localhost:8000"
 
+def add_update_tab(response=None):
+    # The key lets app.py read the selected date before this widget renders and prefetch it
+    selected_date = st.date_input("Date", datetime.now().date(), label_visibility="collapsed",
+                                  key="add_update_date")
 
-def add_update_tab():
-    selected_date = st.date_input("Date", datetime.now().date(), label_visibility="collapsed")
-
-    # Get expenses with authentication
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    response = requests.get(
-        f"{API_url}/expenses/?expense_date={selected_date}",
-        headers=headers
-    )
+    # Get expenses with authentication, unless app.py already fetched them
+    headers = api_client.auth_headers()
+    if response is None:
+        response = api_client.get(
+            "/expenses/",
+            params={"expense_date": str(selected_date)},
+            headers=headers
+        )
 
     expenses = []
     if response.status_code == 200:
@@ -81,14 +83,17 @@ def add_update_tab():
             filtered_expenses = [expense for expense in expense_inputs if expense['amount'] > 0]
 
             # Send request with authentication
-            headers = {"Authorization": f"Bearer {st.session_state.token}"}
-            response = requests.post(
-                f"{API_url}/expenses/?expense_date={selected_date}",
+            headers = api_client.auth_headers()
+            response = api_client.post(
+                "/expenses/",
+                params={"expense_date": str(selected_date)},
                 json=filtered_expenses,
                 headers=headers
             )
 
             if response.status_code == 200:
+                # Only this date and the analytics covering it changed
+                api_client.invalidate_date(selected_date)
                 st.success('Expense updated successfully')
                 st.rerun()  # Refresh the page
             else:
@@ -1,11 +1,10 @@
 import pandas as pd
 import streamlit as st
 import requests
+import api_client
 from datetime import datetime
 import json
 
-API_url = "http://localhost:8000"
-
 
 def analytics_category_tab():
     st.header("📊 Category Analytics")
@@ -22,14 +21,14 @@ def analytics_category_tab():
             st.error("Please login first!")
             return
 
-        headers = {"Authorization": f"Bearer {st.session_state.token}"}
-        payload = {
+        headers = api_client.auth_headers()
+        params = {
             "start_date": start_date.strftime("%Y-%m-%d"),
             "end_date": end_date.strftime("%Y-%m-%d")
         }
 
         try:
-            response = requests.post(f"{API_url}/analytics/", json=payload, headers=headers)
+            response = api_client.get("/analytics/", params=params, headers=headers)
 
             # Debug information
             #st.write(f"🔍 Status Code: {response.status_code}")
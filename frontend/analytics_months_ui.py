@@ -1,43 +1,34 @@
 import streamlit as st
-import pandas as pd
-import requests
+import api_client
+import charts
 from datetime import datetime
-import plotly.express as px
 
-API_url = "http://localhost:8000"
 
+MONTHLY_PARAMS = {"group_by": "month", "max_points": charts.MAX_CHART_POINTS}
 
-def analytics_months_tab():
+
+def analytics_months_tab(response=None):
     st.header("📅 Monthly Trends")
 
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
+    headers = api_client.auth_headers()
 
     with st.spinner("Loading monthly data..."):
         try:
-            response = requests.get(f"{API_url}/analytics_by_month/", headers=headers)
+            if response is None:
+                response = api_client.get("/analytics/summary", params=MONTHLY_PARAMS, headers=headers)
 
             if response.status_code == 200:
-                data = response.json()
+                summary = response.json()
+                data = summary["groups"]
 
                 if data and isinstance(data, list):
-                    df = pd.DataFrame(data)
-
-                    # Create month names mapping
-                    month_map = {
-                        '01': 'Jan', '02': 'Feb', '03': 'Mar', '04': 'Apr',
-                        '05': 'May', '06': 'Jun', '07': 'Jul', '08': 'Aug',
-                        '09': 'Sep', '10': 'Oct', '11': 'Nov', '12': 'Dec'
-                    }
+                    df, line_fig, bar_fig = charts.monthly_figures(response, data, MONTHLY_PARAMS)
 
-                    # Extract year and month for better display
-                    df['Year'] = df['month_year'].str[:4]
-                    df['Month'] = df['month_year'].str[5:7].map(month_map)
-                    df['Year-Month'] = df['Month'] + ' ' + df['Year']
-
-                    # Display metrics
-                    total_months = len(df)
-                    avg_monthly = df['total_amount'].mean()
-                    max_month = df.loc[df['total_amount'].idxmax()]
+                    # Display metrics (computed by the server over every month, even when the
+                    # series below was downsampled)
+                    total_months = summary['group_count']
+                    avg_monthly = summary['group_stats']['mean']
+                    max_monthly = summary['group_stats']['max']
 
                     col1, col2, col3 = st.columns(3)
                     with col1:
@@ -45,30 +36,11 @@ def analytics_months_tab():
                     with col2:
                         st.metric("💰 Avg Monthly", f"INR {avg_monthly:.2f}")
                     with col3:
-                        st.metric("📈 Highest Month", f"INR {max_month['total_amount']:.2f}")
+                        st.metric("📈 Highest Month", f"INR {max_monthly:.2f}")
 
                     # Create visualizations
-                    fig = px.line(
-                        df,
-                        x='Year-Month',
-                        y='total_amount',
-                        title='Monthly Expense Trends',
-                        markers=True,
-                        labels={'total_amount': 'Total Amount', 'Year-Month': 'Month'}
-                    )
-                    fig.update_traces(line=dict(color='#FF4B4B', width=3))
-                    st.plotly_chart(fig, use_container_width=True)
-
-                    # Bar chart
-                    fig2 = px.bar(
-                        df,
-                        x='Year-Month',
-                        y='total_amount',
-                        title='Monthly Expenses',
-                        color='total_amount',
-                        color_continuous_scale='Viridis'
-                    )
-                    st.plotly_chart(fig2, use_container_width=True)
+                    st.plotly_chart(line_fig, use_container_width=True)
+                    st.plotly_chart(bar_fig, use_container_width=True)
 
                     # Display table
                     st.subheader("📋 Monthly Summary")
@@ -76,6 +48,8 @@ def analytics_months_tab():
                     display_df['total_amount'] = display_df['total_amount'].apply(lambda x: f"INR {x:.2f}")
                     display_df.columns = ['Month', 'Total Amount']
                     st.dataframe(display_df, use_container_width=True, hide_index=True)
+                    if len(df) < total_months:
+                        st.caption(f"Showing {len(df)} representative months of {total_months}")
 
                 else:
                     st.info("No monthly data available yet. Start adding expenses to see trends!")
@@ -0,0 +1,181 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import tracing
+
+API_URL = os.getenv("EXPENSE_API_URL", "http://localhost:8000").rstrip("/")
+# (connect, read) seconds
+TIMEOUT = (float(os.getenv("API_CONNECT_TIMEOUT", 3.05)), float(os.getenv("API_READ_TIMEOUT", 30)))
+POOL_SIZE = int(os.getenv("API_POOL_SIZE", 8))
+MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", 3))
+MAX_CACHED_RESPONSES = 128
+# Cached responses younger than this are reused without asking the API; older ones are revalidated
+CACHE_TTL_SECONDS = float(os.getenv("API_CACHE_TTL_SECONDS", 60))
+
+
+# Runs get_many() requests; shared by all sessions since workers only do network I/O
+executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="api-prefetch")
+
+tracing.configure()
+
+
+def create_session():
+    # Retries only idempotent methods (urllib3's default list), with exponential backoff,
+    # and honours Retry-After, e.g. the API's 503 when bcrypt is saturated
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def session():
+    """The keep-alive session of the current Streamlit session."""
+    if "api_session" not in st.session_state:
+        st.session_state.api_session = create_session()
+    return st.session_state.api_session
+
+
+def url(path):
+    return f"{API_URL}{path}"
+
+
+def auth_headers():
+    return {"Authorization": f"Bearer {st.session_state.token}"}
+
+
+def request(http, method, path, headers=None, parent=None, **kwargs):
+    # Every API call goes through here: traced, with the span's context sent as a traceparent header
+    span, headers = tracing.start_client_span(method, path, headers, parent)
+    try:
+        response = http.request(method, url(path), headers=headers, **kwargs)
+    except requests.RequestException as e:
+        tracing.end_client_span(span, error=e)
+        raise
+    tracing.end_client_span(span, response)
+    return response
+
+
+def post(path, **kwargs):
+    kwargs.setdefault("timeout", TIMEOUT)
+    return request(session(), "POST", path, **kwargs)
+
+
+def _cache():
+    return st.session_state.setdefault("api_response_cache", {})
+
+
+def _params_key(params):
+    return tuple(sorted(
+        (name, tuple(str(v) for v in value) if isinstance(value, (list, tuple)) else str(value))
+        for name, value in (params or {}).items()
+    ))
+
+
+def _lookup(path, params, headers, ttl):
+    # (key, cached entry, request headers, fresh cached response or None)
+    store = _cache()
+    headers = dict(headers or {})
+    key = (path, _params_key(params), headers.get("Authorization"))
+
+    entry = store.get(key)
+    if entry is not None:
+        cached, fetched_at = entry
+        if time.monotonic() - fetched_at < ttl:
+            store[key] = store.pop(key)  # most recently used last
+            return key, entry, headers, cached
+        if cached.headers.get("ETag"):
+            headers["If-None-Match"] = cached.headers["ETag"]
+        if cached.headers.get("Last-Modified"):
+            headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+    return key, entry, headers, None
+
+
+def _store(key, entry, response):
+    store = _cache()
+    store.pop(key, None)
+    if response.status_code == 304 and entry is not None:
+        response = entry[0]
+    if response.status_code == 200:
+        store[key] = (response, time.monotonic())
+        while len(store) > MAX_CACHED_RESPONSES:
+            del store[next(iter(store))]
+    return response
+
+
+def get(path, params=None, headers=None, ttl=CACHE_TTL_SECONDS, **kwargs):
+    """Cached GET, per Streamlit session and keyed by path, params and Authorization header.
+
+    Within ttl seconds the stored response is returned without a request. After that it is
+    revalidated with the server's ETag/Last-Modified, and a 304 also returns the stored
+    response, so callers always see a 200 with a body.
+    """
+    kwargs.setdefault("timeout", TIMEOUT)
+    key, entry, headers, fresh = _lookup(path, params, headers, ttl)
+    if fresh is not None:
+        return fresh
+    return _store(key, entry, request(session(), "GET", path, headers, params=params, **kwargs))
+
+
+def get_many(calls, headers=None, ttl=CACHE_TTL_SECONDS):
+    """Run independent cached GETs concurrently; calls maps a name to (path, params).
+
+    Returns the responses by name. Latency is that of the slowest request rather than the
+    sum. Only the HTTP round trips run in worker threads; the session-state cache is read
+    and written here, on the script thread. Calls that fail are left out, so callers can
+    fetch them again and report the error where the data is shown.
+    """
+    responses, pending = {}, {}
+    http = session()
+    parent = tracing.current_context()
+    for name, (path, params) in calls.items():
+        key, entry, request_headers, fresh = _lookup(path, params, headers, ttl)
+        if fresh is not None:
+            responses[name] = fresh
+        else:
+            future = executor.submit(
+                request, http, "GET", path, request_headers, parent, params=params, timeout=TIMEOUT
+            )
+            pending[name] = (key, entry, future)
+    for name, (key, entry, future) in pending.items():
+        try:
+            responses[name] = _store(key, entry, future.result())
+        except requests.RequestException:
+            pass
+    return responses
+
+
+def _covers(params, day):
+    # Whether a cached response can include expenses of day; no date params means all dates
+    params = dict(params)
+    if "expense_date" in params:
+        return params["expense_date"] == day
+    if "dates" in params:
+        return day in params["dates"]
+    return params.get("start_date", day) <= day <= params.get("end_date", day)
+
+
+def invalidate_date(day):
+    """Drop the cached responses a write to day can change: that date and every range or
+    aggregate covering it."""
+    day = str(day)
+    store = _cache()
+    for key in [key for key in store if _covers(key[1], day)]:
+        del store[key]
+
+
+def clear_cache():
+    _cache().clear()
@@ -1,15 +1,13 @@
 import streamlit as st
 from datetime import datetime
-import requests
+import api_client
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import charts
+import tracing
 
 from add_update_ui import add_update_tab
 from analytics_category_ui import analytics_category_tab
-from analytics_months_ui import analytics_months_tab
-
-API_url = "http://localhost:8000"
+from analytics_months_ui import analytics_months_tab, MONTHLY_PARAMS
 
 # Page configuration
 st.set_page_config(
@@ -62,6 +60,8 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+DASHBOARD_VIEWS = ['📝 Add/Update Expenses', '📊 Category Analytics', '📅 Monthly Trends']
+
 # Session states
 if "user" not in st.session_state:
     st.session_state.user = None
@@ -88,7 +88,7 @@ with st.sidebar:
 
         if choice == "Login" and st.button("🚀 Login", use_container_width=True):
             with st.spinner("Logging in..."):
-                login_response = requests.post(f"{API_url}/login/", json={"username": username, "password": password})
+                login_response = api_client.post("/login/", json={"username": username, "password": password})
                 if login_response.status_code == 200:
                     data = login_response.json()
                     st.session_state.user = username
@@ -100,7 +100,7 @@ with st.sidebar:
 
         elif choice == "Create User" and st.button("✨ Create Account", use_container_width=True):
             with st.spinner("Creating account..."):
-                create_response = requests.post(f"{API_url}/create_user/", json={"username": username, "password": password})
+                create_response = api_client.post("/create_user/", json={"username": username, "password": password})
                 if create_response.status_code == 200:
                     st.success("✅ Account created successfully! Please login.")
                 else:
@@ -112,6 +112,7 @@ with st.sidebar:
         if st.button("🚪 Logout", use_container_width=True):
             st.session_state.user = None
             st.session_state.token = None
+            api_client.clear_cache()
             st.rerun()
 
 # ------------------------
@@ -158,15 +159,39 @@ else:
         st.markdown(f"<h1 class='main-header'>Welcome back, {st.session_state.user}! 👋</h1>", unsafe_allow_html=True)
 
         # Quick stats at the top
-        headers = {"Authorization": f"Bearer {st.session_state.token}"}
+        headers = api_client.auth_headers()
         today = datetime.now().date()
 
+        # Everything the dashboard shows is independent, so fetch it concurrently up front, for the
+        # open view only. The date widgets and the view selector have keys, so their values from the
+        # previous run are known before they render.
+        view = st.session_state.get("dashboard_view") or DASHBOARD_VIEWS[0]
+        add_update_date = st.session_state.get("add_update_date", today)
+        selected_date = st.session_state.get("date_selector", today)
+        calls = {
+            "today": ("/analytics/summary", {"start_date": str(today), "end_date": str(today), "group_by": "day"}),
+            "selected": ("/expenses/", {"expense_date": str(selected_date)}),
+        }
+        if view == DASHBOARD_VIEWS[0]:
+            calls["add_update"] = ("/expenses/", {"expense_date": str(add_update_date)})
+        elif view == DASHBOARD_VIEWS[2]:
+            calls["months"] = ("/analytics/summary", MONTHLY_PARAMS)
+        # One parent span, so the concurrent calls of a dashboard load show up as one trace
+        with tracing.tracer.start_as_current_span("dashboard prefetch", attributes={"dashboard.view": view}):
+            prefetched = api_client.get_many(calls, headers)
+
         try:
-            # Get today's expenses for quick stats
-            today_response = requests.get(f"{API_url}/expenses/?expense_date={today}", headers=headers)
+            # Today's total and count are aggregated by the server
+            today_response = prefetched.get("today")
+            if today_response is None:
+                today_response = api_client.get(
+                    "/analytics/summary",
+                    params={"start_date": str(today), "end_date": str(today), "group_by": "day"},
+                    headers=headers
+                )
             if today_response.status_code == 200:
-                expenses = today_response.json()
-                total_today = sum(expense['amount'] for expense in expenses) if expenses else 0
+                summary = today_response.json()
+                total_today = summary['total']
 
                 # Display metrics
                 col1, col2, col3, col4 = st.columns(4)
@@ -181,7 +206,7 @@ else:
                     st.markdown(f"""
                     <div class='metric-card'>
                         <h3>📊 Expenses Today</h3>
-                        <h2>{len(expenses)}</h2>
+                        <h2>{summary['count']}</h2>
                     </div>
                     """, unsafe_allow_html=True)
                 with col3:
@@ -203,17 +228,19 @@ else:
 
         st.markdown("---")
 
-        # Tabs with modern styling
-        tab1, tab2, tab3 = st.tabs(['📝 Add/Update Expenses', '📊 Category Analytics', '📅 Monthly Trends'])
+        # st.tabs would run every tab's code (and fetch its data) on each rerun; a segmented
+        # control renders only the view that is open
+        view = st.segmented_control(
+            "View", DASHBOARD_VIEWS, default=DASHBOARD_VIEWS[0], key="dashboard_view", label_visibility="collapsed"
+        ) or DASHBOARD_VIEWS[0]
 
-        with tab1:
-            add_update_tab()
-
-        with tab2:
+        if view == DASHBOARD_VIEWS[0]:
+            add_update_tab(prefetched.get("add_update"))
+        elif view == DASHBOARD_VIEWS[1]:
+            # Fetches on demand, when "Get Analytics" is pressed
             analytics_category_tab()
-
-        with tab3:
-            analytics_months_tab()
+        else:
+            analytics_months_tab(prefetched.get("months"))
 
         st.markdown("---")
 
@@ -224,7 +251,11 @@ else:
         expense_date = st.date_input("Select Date", value=datetime.now().date(), key="date_selector")
 
         try:
-            expenses_response = requests.get(f"{API_url}/expenses/?expense_date={expense_date}", headers=headers)
+            expenses_response = prefetched.get("selected")
+            if expenses_response is None:
+                expenses_response = api_client.get(
+                    "/expenses/", params={"expense_date": str(expense_date)}, headers=headers
+                )
             if expenses_response.status_code == 200:
                 expenses_data = expenses_response.json()
 
@@ -265,13 +296,7 @@ else:
 
                     # Quick pie chart
                     if len(expenses_data) > 0:
-                        fig = px.pie(
-                            df,
-                            values='amount',
-                            names='category',
-                            title=f'Expense Distribution for {expense_date.strftime("%b %d, %Y")}',
-                            color_discrete_sequence=px.colors.sequential.RdBu
-                        )
+                        fig = charts.expense_pie(expenses_response, expenses_data, expense_date)
                         st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.info("No expenses recorded for this date. Add some expenses in the Add/Update tab!")
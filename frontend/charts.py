@@ -0,0 +1,79 @@
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+# Chart series longer than this are downsampled by the API (LTTB) before they reach the browser
+MAX_CHART_POINTS = 120
+
+MONTH_NAMES = {
+    '01': 'Jan', '02': 'Feb', '03': 'Mar', '04': 'Apr',
+    '05': 'May', '06': 'Jun', '07': 'Jul', '08': 'Aug',
+    '09': 'Sep', '10': 'Oct', '11': 'Nov', '12': 'Dec'
+}
+
+
+def build_monthly_figures(groups):
+    df = pd.DataFrame(groups).rename(columns={'key': 'month_year', 'total': 'total_amount'})
+
+    # Extract year and month for better display
+    df['Year'] = df['month_year'].str[:4]
+    df['Month'] = df['month_year'].str[5:7].map(MONTH_NAMES)
+    df['Year-Month'] = df['Month'] + ' ' + df['Year']
+
+    line = px.line(
+        df,
+        x='Year-Month',
+        y='total_amount',
+        title='Monthly Expense Trends',
+        markers=True,
+        labels={'total_amount': 'Total Amount', 'Year-Month': 'Month'}
+    )
+    line.update_traces(line=dict(color='#FF4B4B', width=3))
+
+    bar = px.bar(
+        df,
+        x='Year-Month',
+        y='total_amount',
+        title='Monthly Expenses',
+        color='total_amount',
+        color_continuous_scale='Viridis'
+    )
+    return df, line, bar
+
+
+def build_expense_pie(expenses, expense_date):
+    return px.pie(
+        pd.DataFrame(expenses),
+        values='amount',
+        names='category',
+        title=f'Expense Distribution for {expense_date.strftime("%b %d, %Y")}',
+        color_discrete_sequence=px.colors.sequential.RdBu
+    )
+
+
+# Figures are keyed by the response's ETag, which names the user and their data version,
+# plus whatever else shaped the request, so they are only rebuilt after that user's data
+# changes. The data itself is not hashed. cache_data hands every session its own copy, so
+# one session updating a figure cannot change what another renders.
+@st.cache_data(max_entries=64, show_spinner=False)
+def _monthly_figures(version, params, _groups):
+    return build_monthly_figures(_groups)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _expense_pie(version, expense_date, _expenses):
+    return build_expense_pie(_expenses, expense_date)
+
+
+def monthly_figures(response, groups, params):
+    version = response.headers.get('ETag')
+    if version is None:
+        return build_monthly_figures(groups)
+    return _monthly_figures(version, tuple(sorted(params.items())), groups)
+
+
+def expense_pie(response, expenses, expense_date):
+    version = response.headers.get('ETag')
+    if version is None:
+        return build_expense_pie(expenses, expense_date)
+    return _expense_pie(version, expense_date, expenses)
@@ -1,14 +1,12 @@
 import streamlit as st
 from datetime import datetime
-import requests
 import pandas as pd
+import api_client
 
 from add_update_ui import add_update_tab
 from analytics_category_ui import analytics_category_tab
 from analytics_months_ui import analytics_months_tab
 
-API_url = "http://localhost:8000"
-
 st.title("Expense Management System")
 
 # Session states
@@ -26,7 +24,7 @@ if st.session_state.user is None:
     password = st.text_input("Password", type="password")
 
     if choice == "Login" and st.button("Login"):
-        response = requests.post(f"{API_url}/login/", json={"username": username, "password": password})
+        response = api_client.post("/login/", json={"username": username, "password": password})
         if response.status_code == 200:
             data = response.json()
             st.session_state.user = username
@@ -37,7 +35,7 @@ if st.session_state.user is None:
             st.error("Invalid credentials")
 
     elif choice == "Create User" and st.button("Create User"):
-        response = requests.post(f"{API_url}/create_user/", json={"username": username, "password": password})
+        response = api_client.post("/create_user/", json={"username": username, "password": password})
         if response.status_code == 200:
             st.success("User created successfully, please login.")
         else:
@@ -62,8 +60,8 @@ else:
         analytics_months_tab()
 
     # Fetch expenses (with auth header)
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    response = requests.get(f"{API_url}/expenses?date={expense_date}", headers=headers)
+    headers = api_client.auth_headers()
+    response = api_client.get(f"/expenses?date={expense_date}", headers=headers)
 
     if response.status_code == 200:
         expenses = response.json()
@@ -77,4 +75,5 @@ else:
     if st.button("Logout"):
         st.session_state.user = None
         st.session_state.token = None
+        api_client.clear_cache()
         st.rerun()  # Changed from experimental_rerun() to rerun()
\ No newline at end of file
@@ -0,0 +1,66 @@
+import os
+
+from opentelemetry import context, propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+# Same settings as the API's tracing; point both at one TRACE_FILE to read a request end to end
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", 1.0))
+
+# A no-op tracer until configure() installs a provider
+tracer = trace.get_tracer("expense-frontend")
+_provider = None
+
+
+def configure(service_name="expense-frontend"):
+    """Install the SDK tracer provider writing spans to TRACE_FILE, once, if TRACING_ENABLED."""
+    global _provider
+    if not TRACING_ENABLED or _provider is not None:
+        return _provider
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO)),
+    )
+    exporter = ConsoleSpanExporter(
+        out=open(TRACE_FILE, "a", encoding="utf-8"),
+        formatter=lambda span: span.to_json(indent=None) + "\n",
+    )
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    return _provider
+
+
+def current_context():
+    # Worker threads do not inherit the caller's context; capture it before handing work over
+    return context.get_current()
+
+
+def start_client_span(method, path, headers=None, parent=None):
+    """Start a span for an API call; returns it with a copy of headers carrying its traceparent."""
+    span = tracer.start_span(
+        f"{method} {path}",
+        context=parent,
+        kind=SpanKind.CLIENT,
+        attributes={"http.request.method": method, "url.path": path},
+    )
+    headers = dict(headers or {})
+    propagate.inject(headers, context=trace.set_span_in_context(span, parent))
+    return span, headers
+
+
+def end_client_span(span, response=None, error=None):
+    if response is not None:
+        span.set_attribute("http.response.status_code", response.status_code)
+        if response.status_code >= 500:
+            span.set_status(Status(StatusCode.ERROR))
+    if error is not None:
+        span.record_exception(error)
+        span.set_status(Status(StatusCode.ERROR, type(error).__name__))
+    span.end()
@@ -0,0 +1,69 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import analytics
+
+ROWS = [
+    {'expense_date': date(2024, 1, 30), 'category': 'Food', 'total_amount': Decimal('10.00'), 'expense_count': 2},
+    {'expense_date': date(2024, 1, 31), 'category': 'Rent', 'total_amount': Decimal('100.00'), 'expense_count': 1},
+    {'expense_date': date(2024, 2, 1), 'category': 'Food', 'total_amount': Decimal('30.00'), 'expense_count': 3},
+    {'expense_date': date(2024, 3, 5), 'category': 'Food', 'total_amount': Decimal('20.00'), 'expense_count': 4},
+]
+
+
+def test_totals_and_matrices():
+    summary = analytics.summarize(ROWS)
+    assert (summary['total'], summary['count'], summary['mean']) == (Decimal('160.00'), 10, Decimal('16.00'))
+    assert summary['by_category'] == {'Rent': Decimal('100.00'), 'Food': Decimal('60.00')}
+    assert summary['by_month'] == {'2024-01': Decimal('110.00'), '2024-02': Decimal('30.00'), '2024-03': Decimal('20.00')}
+    assert summary['category_by_month']['Food'] == {
+        '2024-01': Decimal('10.00'), '2024-02': Decimal('30.00'), '2024-03': Decimal('20.00'),
+    }
+
+
+def test_month_groups_and_stats():
+    summary = analytics.summarize(ROWS, 'month')
+    assert [group['key'] for group in summary['groups']] == ['2024-01', '2024-02', '2024-03']
+    stats = summary['group_stats']
+    assert (stats['min'], stats['max'], stats['max_key']) == (Decimal('20.00'), Decimal('110.00'), '2024-01')
+    assert stats['percentiles']['p50'] == Decimal('30.00')
+    assert stats['percentiles']['p90'] == Decimal('94.00')
+
+
+@pytest.mark.parametrize('group_by, keys', [
+    ('day', ['2024-01-30', '2024-01-31', '2024-02-01', '2024-03-05']),
+    ('week', ['2024-W05', '2024-W10']),
+    ('category', ['Rent', 'Food']),
+])
+def test_group_by(group_by, keys):
+    assert [group['key'] for group in analytics.summarize(ROWS, group_by)['groups']] == keys
+
+
+def test_empty_range():
+    summary = analytics.summarize([], 'day')
+    assert (summary['total'], summary['count'], summary['mean'], summary['groups']) == (0, 0, None, [])
+    assert summary['group_stats']['percentiles'] == {'p50': None, 'p90': None, 'p95': None}
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    values = [0] * 50 + [100] + [0] * 49
+    kept = analytics.lttb(values, 10)
+    assert len(kept) == 10
+    assert (kept[0], kept[-1]) == (0, 99)
+    assert 50 in kept
+    assert kept == sorted(kept)
+    assert analytics.lttb(values[:5], 10) == [0, 1, 2, 3, 4]
+
+
+def test_max_points_only_downsamples_the_series():
+    rows = [
+        {'expense_date': date(2024, 1, 1 + i), 'category': 'Food', 'total_amount': Decimal(i), 'expense_count': 1}
+        for i in range(20)
+    ]
+    summary = analytics.summarize(rows, 'day', max_points=5)
+    assert len(summary['groups']) == 5
+    assert summary['group_count'] == 20
+    assert summary['total'] == Decimal(190)
+    assert summary['group_stats']['max'] == Decimal(19)
@@ -0,0 +1,179 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+import async_db_helper
+import db_helper
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, sql, params=None):
+        self.connection.calls.append(('execute', sql, params))
+        if self.connection.fail_on_execute:
+            raise RuntimeError('lost connection')
+
+    async def executemany(self, sql, rows):
+        self.connection.calls.append(('executemany', sql, list(rows)))
+
+    async def fetchall(self):
+        return list(self.connection.rows)
+
+    async def fetchone(self):
+        return self.connection.rows[0] if self.connection.rows else None
+
+
+class FakeConnection:
+    def __init__(self, rows=(), fail_on_execute=False):
+        self.rows = rows
+        self.fail_on_execute = fail_on_execute
+        self.calls = []
+
+    def cursor(self, cursor_class):
+        return FakeCursor(self)
+
+    async def begin(self):
+        self.calls.append(('begin',))
+
+    async def commit(self):
+        self.calls.append(('commit',))
+
+    async def rollback(self):
+        self.calls.append(('rollback',))
+
+    def close(self):
+        self.calls.append(('close',))
+
+
+class FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+        self.checked_out = 0
+
+    async def acquire(self):
+        self.checked_out += 1
+        return self.connection
+
+    def release(self, connection):
+        # Like aiomysql's Pool.release: not a coroutine, but returns an awaitable
+        self.checked_out -= 1
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    def install(**kwargs):
+        pool = FakePool(FakeConnection(**kwargs))
+        monkeypatch.setattr(async_db_helper, 'pool', pool)
+        return pool
+    return install
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_write_commits_and_releases(fake_pool):
+    pool = fake_pool()
+
+    async def write():
+        async with async_db_helper.get_db_cursor(commit=True) as cursor:
+            await cursor.execute('UPDATE expenses SET amount = 1')
+
+    run(write())
+    assert [call[0] for call in pool.connection.calls] == ['begin', 'execute', 'commit']
+    assert pool.checked_out == 0
+
+
+def test_failed_write_rolls_back_and_releases(fake_pool):
+    pool = fake_pool(fail_on_execute=True)
+
+    async def write():
+        async with async_db_helper.get_db_cursor(commit=True) as cursor:
+            await cursor.execute('UPDATE expenses SET amount = 1')
+
+    with pytest.raises(RuntimeError):
+        run(write())
+    assert [call[0] for call in pool.connection.calls] == ['begin', 'execute', 'rollback', 'close']
+    assert pool.checked_out == 0
+
+
+@pytest.mark.parametrize('commit', [False, True])
+def test_cancelled_query_closes_the_connection(fake_pool, commit):
+    pool = fake_pool()
+
+    async def read():
+        async with async_db_helper.get_db_cursor(commit=commit) as cursor:
+            await cursor.execute('SELECT 1')
+            raise asyncio.CancelledError
+
+    with pytest.raises(asyncio.CancelledError):
+        run(read())
+    assert pool.connection.calls[-1] == ('close',)
+    assert pool.checked_out == 0
+
+
+def test_reads_run_without_a_transaction(fake_pool):
+    pool = fake_pool(rows=[{'month_year': '2024-08', 'total_amount': 10}])
+    assert run(async_db_helper.fetch_user_expenses_by_month(1)) == [{'month_year': '2024-08', 'total_amount': 10}]
+    assert pool.connection.calls == [('execute', db_helper.FETCH_USER_EXPENSES_BY_MONTH_SQL, (1,))]
+    assert pool.checked_out == 0
+
+
+@pytest.mark.parametrize('call, sql, params', [
+    (lambda: async_db_helper.fetch_user_expenses(1, date(2024, 8, 15)),
+     db_helper.FETCH_USER_EXPENSES_SQL, (date(2024, 8, 15), 1)),
+    (lambda: async_db_helper.fetch_user_expense_summary(1, date(2024, 8, 1), date(2024, 8, 31)),
+     db_helper.FETCH_USER_EXPENSE_SUMMARY_SQL, (1, date(2024, 8, 1), date(2024, 8, 31))),
+    (lambda: async_db_helper.fetch_user_daily_rollup(1, date(2024, 8, 1), date(2024, 8, 31)),
+     db_helper.FETCH_USER_DAILY_ROLLUP_SQL, (1, date(2024, 8, 1), date(2024, 8, 31))),
+])
+def test_reads_use_the_shared_statements(fake_pool, call, sql, params):
+    pool = fake_pool()
+    run(call())
+    assert pool.connection.calls == [('execute', sql, params)]
+
+
+def test_expenses_for_dates_are_grouped(fake_pool):
+    fake_pool(rows=[{'expense_date': date(2024, 8, 2), 'amount': 5}])
+    days = [date(2024, 8, 1), date(2024, 8, 2)]
+    grouped = run(async_db_helper.fetch_user_expenses_for_dates(1, days, start_date=days[0], end_date=days[-1]))
+    assert grouped == {'2024-08-01': [], '2024-08-02': [{'amount': 5}]}
+
+
+def test_replace_runs_in_one_transaction(fake_pool):
+    pool = fake_pool()
+    rows = [(10, 'Food', ''), (5, 'Rent', ''), (1, 'Food', '')]
+    assert run(async_db_helper.replace_user_expenses_for_date(1, date(2024, 8, 15), rows, batch_size=2)) == 3
+
+    calls = pool.connection.calls
+    assert calls[0] == ('begin',) and calls[-1] == ('commit',)
+    assert calls[1] == ('execute', db_helper.DELETE_USER_EXPENSES_FOR_DATE_SQL, (date(2024, 8, 15), 1))
+    assert [len(call[2]) for call in calls if call[0] == 'executemany'] == [2, 1]
+    refresh = [(call[1], call[2]) for call in calls if call[0] == 'execute'][1:]
+    assert refresh == db_helper.rollup_refresh_statements(1, [date(2024, 8, 15)])
+
+
+def test_matches_db_helper_against_the_database():
+    # Same statements through both drivers must give the same rows
+    async def fetch():
+        try:
+            return await async_db_helper.fetch_user_expense_summary(1, date(2024, 8, 1), date(2024, 8, 31))
+        finally:
+            await async_db_helper.close_pool()
+
+    rows = run(fetch())
+    expected = db_helper.fetch_user_expense_summary(1, date(2024, 8, 1), date(2024, 8, 31))
+    assert sorted((row['category'], row['total']) for row in rows) == \
+        sorted((row['category'], row['total']) for row in expected)
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from unittest.mock import Mock
+
+import pytest
+
+import async_db_helper
+import db_helper
+from cache import TTLCache
+from password_hashing import PasswordHasher
+
+
+class FakeCursor:
+    def __init__(self, users, queries):
+        self.users = users
+        self.queries = queries
+        self.row = None
+
+    async def execute(self, sql, params):
+        self.queries.append((sql, params))
+        self.row = self.users.get(params[0])
+
+    async def fetchone(self):
+        return self.row
+
+
+@pytest.fixture
+def hasher():
+    return PasswordHasher(rounds=4)
+
+
+@pytest.fixture
+def users(hasher):
+    return {'alice': {'id': 1, 'username': 'alice', 'hashed_password': hasher.hash('secret')}}
+
+
+@pytest.fixture
+def fake_db(monkeypatch, hasher, users):
+    queries = []
+
+    @asynccontextmanager
+    async def get_db_cursor(commit=False):
+        yield FakeCursor(users, queries)
+
+    monkeypatch.setattr(db_helper, 'hasher', hasher)
+    monkeypatch.setattr(async_db_helper, 'get_db_cursor', get_db_cursor)
+    db_helper.unknown_users.clear()
+    db_helper.dummy_hash.cache_clear()
+    yield queries
+    db_helper.unknown_users.clear()
+    db_helper.dummy_hash.cache_clear()
+
+
+def authenticate(username, password):
+    return asyncio.run(async_db_helper.authenticate_user(username, password))
+
+
+def test_valid_credentials_use_one_query(fake_db):
+    assert authenticate('alice', 'secret') == {'id': 1, 'username': 'alice'}
+    assert fake_db == [(db_helper.AUTHENTICATE_USER_SQL, ('alice',))]
+
+
+def test_wrong_password(fake_db):
+    assert authenticate('alice', 'nope') is None
+
+
+def test_unknown_user_is_negatively_cached_and_still_verified(fake_db):
+    assert authenticate('mallory', 'secret') is None
+    assert authenticate('mallory', 'secret') is None
+    assert len(fake_db) == 1
+    # Both attempts paid for a bcrypt verification, like a real user would
+    assert db_helper.hasher.stats()['verifies'] == 2
+
+
+def test_cached_miss_expires_despite_repeated_attempts(fake_db, monkeypatch, hasher, users):
+    monkeypatch.setattr(db_helper, 'unknown_users', TTLCache(maxsize=10, ttl=0.2))
+    assert authenticate('mallory', 'secret') is None
+    # Signs up on another worker, which cannot invalidate this worker's negative cache
+    users['mallory'] = {'id': 2, 'username': 'mallory', 'hashed_password': hasher.hash('secret')}
+
+    # Attempts answered from the cache do not push its expiry forward
+    for _ in range(2):
+        time.sleep(0.08)
+        assert authenticate('mallory', 'secret') is None
+    time.sleep(0.08)
+    assert authenticate('mallory', 'secret') == {'id': 2, 'username': 'mallory'}
+    assert len(fake_db) == 2
+
+
+def test_login_upgrades_an_outdated_hash(fake_db, monkeypatch, users):
+    old_hash = users['alice']['hashed_password']
+    monkeypatch.setattr(db_helper, 'hasher', PasswordHasher(rounds=5))
+    assert authenticate('alice', 'secret') == {'id': 1, 'username': 'alice'}
+
+    [_, (sql, (new_hash, username, expected_hash))] = fake_db
+    assert (sql, username, expected_hash) == (db_helper.UPDATE_PASSWORD_HASH_SQL, 'alice', old_hash)
+    assert db_helper.hasher.verify('secret', new_hash) == (True, None)
+
+
+def test_sign_up_clears_the_cached_miss(fake_db, monkeypatch):
+    @contextmanager
+    def get_db_cursor(commit=False):
+        yield Mock()
+
+    monkeypatch.setattr(db_helper, 'get_db_cursor', get_db_cursor)
+    assert authenticate('mallory', 'secret') is None
+    db_helper.create_user('mallory', 'secret')
+    assert db_helper.unknown_users.get(('mallory',)) is db_helper.MISS
+    assert 'mallory' not in db_helper.unknown_users._versions
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from decimal import Decimal
+
+import pytest
+
+from cache import MISS, RedisCache, TTLCache, aget_or_load, get_or_load
+
+
+def test_hit_and_miss_counters():
+    cache = TTLCache()
+    assert cache.get((1, 'expenses', '2024-01-01')) is MISS
+    cache.set((1, 'expenses', '2024-01-01'), [])
+    assert cache.get((1, 'expenses', '2024-01-01')) == []
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set((1, 'a'), 'a')
+    cache.set((1, 'b'), 'b')
+    cache.get((1, 'a'))
+    cache.set((1, 'c'), 'c')
+    assert cache.get((1, 'b')) is MISS
+    assert cache.get((1, 'a')) == 'a'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire():
+    cache = TTLCache(ttl=0.01)
+    cache.set((1, 'a'), 'a')
+    time.sleep(0.02)
+    assert cache.get((1, 'a')) is MISS
+    assert cache.stats()['expirations'] == 1
+
+
+def test_invalidate_user_only_drops_that_user():
+    cache = TTLCache()
+    cache.set((1, 'analytics'), 'mine')
+    cache.set((1, 'analytics_by_month'), 'mine too')
+    cache.set((2, 'analytics'), 'theirs')
+    cache.invalidate_user(1)
+    assert cache.get((1, 'analytics')) is MISS
+    assert cache.get((1, 'analytics_by_month')) is MISS
+    assert cache.get((2, 'analytics')) == 'theirs'
+    assert cache.stats()['invalidations'] == 2
+
+
+def test_delete_leaves_no_per_user_state():
+    cache = TTLCache()
+    cache.set(('mallory',), True)
+    cache.delete(('mallory',))
+    cache.delete(('nobody',))
+    assert cache.get(('mallory',)) is MISS
+    assert (cache._entries, cache._user_keys, cache._generations, cache._versions) == ({}, {}, {}, {})
+
+
+def test_get_or_load_calls_loader_once():
+    cache = TTLCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {'Food': 10}
+
+    assert get_or_load(cache, (1, 'analytics'), loader) == {'Food': 10}
+    assert get_or_load(cache, (1, 'analytics'), loader) == {'Food': 10}
+    assert len(calls) == 1
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    cache = TTLCache()
+
+    def loader():
+        cache.invalidate_user(1)  # a write commits while the value is being loaded
+        return 'stale'
+
+    assert get_or_load(cache, (1, 'analytics'), loader) == 'stale'
+    assert cache.get((1, 'analytics')) is MISS
+
+
+def test_redis_cache_invalidation_is_shared_between_workers():
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    worker_a = RedisCache(client=fakeredis.FakeRedis(server=server))
+    worker_b = RedisCache(client=fakeredis.FakeRedis(server=server))
+
+    worker_a.set((1, 'analytics_by_month'), [{'month_year': '2024-01', 'total_amount': Decimal('10.00')}])
+    worker_a.set((2, 'analytics_by_month'), [])
+    assert worker_b.get((1, 'analytics_by_month')) == [{'month_year': '2024-01', 'total_amount': Decimal('10.00')}]
+
+    worker_b.invalidate_user(1)
+    assert worker_a.get((1, 'analytics_by_month')) is MISS
+    assert worker_a.get((2, 'analytics_by_month')) == []
+
+
+def test_redis_cache_errors_are_misses():
+    class DownClient:
+        def get(self, key):
+            raise ConnectionError('redis is down')
+
+        set = incr = get
+
+    cache = RedisCache(client=DownClient())
+    assert get_or_load(cache, (1, 'analytics'), lambda: 'from mysql') == 'from mysql'
+    cache.invalidate_user(1)
+    stats = cache.stats()
+    assert (stats['errors'], stats['misses'], stats['invalidations']) == (2, 1, 0)
+
+
+def test_async_get_or_load():
+    cache = TTLCache()
+
+    async def loader():
+        return [{'month_year': '2024-01'}]
+
+    async def scenario():
+        first = await aget_or_load(cache, (1, 'analytics_by_month'), loader)
+        await cache.ainvalidate_user(1)
+        return first, cache.get((1, 'analytics_by_month'))
+
+    assert asyncio.run(scenario()) == ([{'month_year': '2024-01'}], MISS)
+
+
+def test_data_version_is_bumped_by_invalidation():
+    cache = TTLCache()
+    before = cache.data_version(1)
+    assert cache.data_version(1) == before
+    cache.invalidate_user(1)
+    assert cache.data_version(1) > before
+    assert cache.data_version(2) == before
+    bumped = cache.data_version(1)
+    cache.clear()
+    assert cache.data_version(1) == bumped
+
+
+def test_redis_data_version_is_shared_between_workers():
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    worker_a = RedisCache(client=fakeredis.FakeRedis(server=server))
+    worker_b = RedisCache(client=fakeredis.FakeRedis(server=server))
+
+    version = worker_a.data_version(1)
+    assert worker_b.data_version(1) == version
+    worker_b.invalidate_user(1)
+    assert worker_a.data_version(1) > version
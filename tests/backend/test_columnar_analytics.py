@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import SERVER
+import columnar_analytics
+import db_helper
+from columnar_analytics import SnapshotStore
+
+ROWS = [
+    (date(2022, 3, 1), Decimal('10.50'), 'Food'),
+    (date(2022, 3, 9), Decimal('4.25'), 'Rent'),
+    (date(2023, 7, 2), Decimal('1.10'), 'Food'),
+    (date(2023, 12, 31), Decimal('20.00'), 'Shopping'),
+]
+CUTOFF = date(2024, 1, 1)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path))
+    monkeypatch.setattr(columnar_analytics, 'store', store)
+    store.write(1, [ROWS[:2], ROWS[2:]], CUTOFF)
+    return store
+
+
+def test_snapshot_is_partitioned_by_year(store):
+    manifest = store.manifest(1)
+    assert (manifest['cutoff'], manifest['years'], manifest['rows']) == (CUTOFF, [2022, 2023], 4)
+    _, table = store.read(1, date(2023, 1, 1), date(2023, 12, 1))
+    assert table['amount_cents'].to_pylist() == [110]
+
+
+def test_category_totals_merge_the_mysql_tail(store):
+    tail_calls = []
+
+    def fetch_tail(user_id, start, end):
+        tail_calls.append((start, end))
+        return [{'category': 'Food', 'total': Decimal('2.00')}, {'category': 'Other', 'total': Decimal('3.00')}]
+
+    rows = columnar_analytics.category_totals(1, date(2022, 3, 5), date(2024, 6, 30), fetch_tail)
+    assert {row['category']: row['total'] for row in rows} == {
+        'Rent': Decimal('4.25'), 'Food': Decimal('3.10'), 'Shopping': Decimal('20.00'), 'Other': Decimal('3.00'),
+    }
+    assert tail_calls == [(CUTOFF, date(2024, 6, 30))]
+
+
+def test_range_before_cutoff_needs_no_tail(store):
+    def fetch_tail(user_id, start, end):
+        raise AssertionError('MySQL should not be queried')
+
+    rows = columnar_analytics.category_totals(1, date(2022, 1, 1), date(2022, 12, 31), fetch_tail)
+    assert sorted((row['category'], row['total']) for row in rows) == [
+        ('Food', Decimal('10.50')), ('Rent', Decimal('4.25')),
+    ]
+
+
+def test_snapshot_is_taken_from_the_daily_rollup(store, monkeypatch):
+    calls = []
+
+    def iter_user_daily_rollup(user_id, before):
+        calls.append((user_id, before))
+        yield [row for row in ROWS if row[0] < before]
+
+    monkeypatch.setattr(db_helper, 'iter_user_daily_rollup', iter_user_daily_rollup)
+    assert columnar_analytics.snapshot_user(1, today=date(2023, 8, 20)) == 3
+    assert calls == [(1, date(2023, 8, 1))]
+    assert store.manifest(1)['cutoff'] == date(2023, 8, 1)
+
+
+def test_no_snapshot_falls_back(store):
+    assert columnar_analytics.category_totals(2, date(2020, 1, 1), date(2024, 1, 1)) is None
+
+
+def test_write_before_cutoff_invalidates(store):
+    assert not store.invalidate(1, [date(2024, 2, 1)])
+    assert store.manifest(1) is not None
+    assert store.invalidate(1, [date(2024, 2, 1), date(2023, 5, 5)])
+    assert store.manifest(1) is None
+
+
+def test_snapshot_racing_a_write_is_not_published(store):
+    def batches():
+        yield ROWS
+        store.invalidate(1, [date(2022, 3, 1)])
+
+    assert store.write(1, batches(), CUTOFF) is None
+    assert store.manifest(1) is None
+
+
+def test_later_write_after_the_cutoff_does_not_mask_an_earlier_one(store):
+    def batches():
+        yield ROWS
+        store.invalidate(1, [date(2022, 3, 1)])
+        store.invalidate(1, [date(2024, 2, 1)])
+
+    assert store.write(1, batches(), CUTOFF) is None
+    assert store.manifest(1) is None
+
+
+def test_published_snapshot_trims_the_invalidation_log(store, tmp_path):
+    store.invalidate(1, [date(2022, 3, 1)])
+    assert store.write(1, [ROWS], CUTOFF) == 4
+    assert (tmp_path / 'user_id=1' / columnar_analytics.INVALIDATED).read_text() == ''
+
+
+def test_new_snapshot_replaces_old_version(store, tmp_path):
+    old_version = store.manifest(1)['version']
+    store.write(1, [ROWS[:1]], CUTOFF)
+    assert store.manifest(1)['rows'] == 1
+    assert not (tmp_path / 'user_id=1' / old_version).exists()
+
+
+def test_snapshot_invalidation_runs_off_the_event_loop(monkeypatch):
+    calls = []
+
+    class FakeStore:
+        def invalidate(self, user_id, dates):
+            calls.append((user_id, dates, threading.current_thread()))
+
+    monkeypatch.setattr(columnar_analytics, 'COLUMNAR_ANALYTICS_ENABLED', True)
+    monkeypatch.setattr(columnar_analytics, 'store', FakeStore())
+    asyncio.run(SERVER.invalidate_snapshot(1, [date(2024, 8, 15)]))
+    [(user_id, dates, thread)] = calls
+    assert (user_id, dates) == (1, [date(2024, 8, 15)])
+    assert thread is not threading.main_thread()
@@ -0,0 +1,105 @@
+import gzip
+import zlib
+
+import pytest
+
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware
+
+BODY = b'{"amount": 10.5}\n' * 200
+
+
+def make_client():
+    def ndjson(request):
+        return Response(BODY, media_type='application/x-ndjson')
+
+    def small(request):
+        return Response(b'{}', media_type='application/json')
+
+    def parquet(request):
+        return Response(BODY, media_type='application/vnd.apache.parquet')
+
+    def stream(request):
+        return StreamingResponse(iter([BODY[:1000], BODY[1000:]]), media_type='application/x-ndjson')
+
+    app = Starlette(routes=[Route('/ndjson', ndjson), Route('/small', small), Route('/parquet', parquet),
+                            Route('/stream', stream)])
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    return TestClient(app)
+
+
+def test_large_responses_are_gzipped():
+    response = make_client().get('/ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert int(response.headers['content-length']) < len(BODY)
+    assert response.content == BODY
+
+
+def test_small_and_precompressed_responses_are_left_alone():
+    client = make_client()
+    assert 'content-encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    response = client.get('/parquet', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    assert response.content == BODY
+
+
+def test_no_accept_encoding():
+    response = make_client().get('/ndjson', headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in response.headers
+
+
+class FakeBrotli:
+    """Stands in for the brotli module: a deflate stream behind brotli's Compressor interface."""
+
+    class Compressor:
+        def __init__(self, quality):
+            self.stream = zlib.compressobj()
+
+        def process(self, body):
+            return self.stream.compress(body)
+
+        def flush(self):
+            return self.stream.flush(zlib.Z_SYNC_FLUSH)
+
+        def finish(self):
+            return self.stream.flush()
+
+
+def get_raw(path, accept_encoding):
+    with make_client().stream('GET', path, headers={'Accept-Encoding': accept_encoding}) as response:
+        return response.headers, b''.join(response.iter_raw())
+
+
+@pytest.mark.parametrize('path', ['/ndjson', '/stream'])
+def test_br_is_preferred_when_available(monkeypatch, path):
+    monkeypatch.setattr(compression, 'brotli', FakeBrotli)
+    headers, raw = get_raw(path, 'gzip, br')
+    assert headers['content-encoding'] == 'br'
+    assert zlib.decompress(raw) == BODY
+
+
+def test_precompressed_responses_are_not_brotli_encoded(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', FakeBrotli)
+    headers, raw = get_raw('/parquet', 'br')
+    assert 'content-encoding' not in headers
+    assert raw == BODY
+
+
+def test_gzip_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    headers, raw = get_raw('/ndjson', 'gzip, br')
+    assert headers['content-encoding'] == 'gzip'
+    assert gzip.decompress(raw) == BODY
+
+
+def test_brotli_round_trip(monkeypatch):
+    brotli = pytest.importorskip('brotli')
+    monkeypatch.setattr(compression, 'brotli', brotli)
+    headers, raw = get_raw('/stream', 'br')
+    assert headers['content-encoding'] == 'br'
+    assert brotli.decompress(raw) == BODY
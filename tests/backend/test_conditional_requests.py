@@ -0,0 +1,64 @@
+import asyncio
+
+from fastapi import Response
+from starlette.requests import Request
+
+import SERVER
+
+WRITE = 1_700_000_000_100_000_000  # ns; a second write lands 0.5s later, in the same second
+SECOND_OVER = 1_700_000_001_000_000_000
+
+
+class FakeCache:
+    def __init__(self, version):
+        self.version = version
+
+    async def adata_version(self, user_id):
+        return self.version
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def time_ns(self):
+        return self.now
+
+
+def conditional_get(monkeypatch, version, now=SECOND_OVER + 60 * 10**9, **headers):
+    monkeypatch.setattr(SERVER, 'read_cache', FakeCache(version))
+    monkeypatch.setattr(SERVER, 'time', FakeClock(now))
+    request = Request({
+        'type': 'http',
+        'headers': [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()],
+    })
+    response = Response()
+    return asyncio.run(SERVER.not_modified(request, response, 1)), response
+
+
+def test_matching_etag_is_not_modified(monkeypatch):
+    _, first = conditional_get(monkeypatch, WRITE)
+    result, _ = conditional_get(monkeypatch, WRITE, if_none_match=first.headers['etag'])
+    assert result.status_code == 304
+
+
+def test_own_last_modified_is_not_modified(monkeypatch):
+    _, first = conditional_get(monkeypatch, WRITE)
+    assert first.headers['last-modified'] == 'Tue, 14 Nov 2023 22:13:21 GMT'  # rounded up
+    result, _ = conditional_get(monkeypatch, WRITE, if_modified_since=first.headers['last-modified'])
+    assert result.status_code == 304
+
+
+def test_no_last_modified_until_the_write_second_is_over(monkeypatch):
+    _, first = conditional_get(monkeypatch, WRITE, now=WRITE + 200_000_000)
+    assert 'last-modified' not in first.headers
+    # A write later in the same second is caught by the ETag
+    assert conditional_get(monkeypatch, WRITE + 500_000_000, if_none_match=first.headers['etag'])[0] is None
+    _, later = conditional_get(monkeypatch, WRITE, now=SECOND_OVER)
+    assert 'last-modified' in later.headers
+
+
+def test_write_after_last_modified_is_modified(monkeypatch):
+    _, first = conditional_get(monkeypatch, WRITE)
+    since = first.headers['last-modified']
+    assert conditional_get(monkeypatch, SECOND_OVER + 1, if_modified_since=since)[0] is None
@@ -1,6 +1,11 @@
+import uuid
+from datetime import date
+
 from backend import db_helper
 import pytest
 
+import columnar_analytics
+
 def test_fetch_expense_for_date():
     expenses = db_helper.fetch_expense_for_date('2024-08-15')
     assert len(expenses) == 1
@@ -12,4 +17,148 @@ def test_fetch_expenses_for_date_invalid_date() :
 
 def test_fetch_expense_summary_invalid_range():
     summary = db_helper. fetch_expense_summary ("2099-01-01", "2099-12-03")
-    assert len (summary) == 0
\ No newline at end of file
+    assert len (summary) == 0
+
+def test_expenses_for_dates_query_range_and_fields():
+    sql, params = db_helper.expenses_for_dates_query(1, ('amount',), '2024-08-01', '2024-08-31')
+    assert sql.startswith('SELECT expense_date, amount FROM expenses')
+    assert 'expense_date BETWEEN %s AND %s' in sql
+    assert params == (1, '2024-08-01', '2024-08-31')
+
+def test_expenses_for_dates_query_date_list():
+    sql, params = db_helper.expenses_for_dates_query(1, dates=['2024-08-01', '2024-08-15'])
+    assert 'expense_date IN (%s, %s)' in sql
+    assert params == (1, '2024-08-01', '2024-08-15')
+
+def test_group_expenses_by_date_keeps_empty_days():
+    from datetime import date
+    rows = [{'expense_date': date(2024, 8, 2), 'amount': 5}]
+    grouped = db_helper.group_expenses_by_date(rows, [date(2024, 8, 1), date(2024, 8, 2)])
+    assert grouped == {'2024-08-01': [], '2024-08-02': [{'amount': 5}]}
+
+def test_connection_is_released_when_the_cursor_cannot_be_opened(monkeypatch):
+    from db_pool import ConnectionPool
+
+    class BrokenConnection:
+        def cursor(self, dictionary=True):
+            raise RuntimeError('connection lost')
+
+        def rollback(self):
+            raise RuntimeError('connection lost')
+
+        def close(self):
+            pass
+
+    pool = ConnectionPool(BrokenConnection, size=1, max_overflow=0, timeout=0.1)
+    monkeypatch.setattr(db_helper, 'pool', pool)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            with db_helper.get_db_cursor():
+                pass
+    stats = pool.stats()
+    assert (stats['checked_out'], stats['timeouts'], stats['closed']) == (0, 0, 2)
+
+
+@pytest.fixture
+def rollup_user():
+    # A throwaway user, so the rollup checks never touch real data
+    username = f'rollup-test-{uuid.uuid4().hex[:8]}'
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute("INSERT INTO users (username, hashed_password) VALUES (%s, 'x')", (username,))
+        user_id = cursor.lastrowid
+    yield user_id
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        for table in ('expenses', 'expense_daily_rollup', 'expense_monthly_rollup', 'users'):
+            cursor.execute(f"DELETE FROM {table} WHERE {'id' if table == 'users' else 'user_id'}=%s", (user_id,))
+
+
+def assert_rollups_match_expenses(user_id):
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(
+            '''SELECT expense_date, category, SUM(amount) AS total_amount, COUNT(*) AS expense_count
+               FROM expenses WHERE user_id=%s GROUP BY expense_date, category ORDER BY expense_date, category''',
+            (user_id,)
+        )
+        daily = cursor.fetchall()
+        cursor.execute(
+            '''SELECT expense_date, category, total_amount, expense_count FROM expense_daily_rollup
+               WHERE user_id=%s ORDER BY expense_date, category''',
+            (user_id,)
+        )
+        assert cursor.fetchall() == daily
+
+        cursor.execute(
+            '''SELECT DATE_FORMAT(expense_date, '%%Y-%%m') AS month_year, SUM(amount) AS total_amount,
+                      COUNT(*) AS expense_count
+               FROM expenses WHERE user_id=%s GROUP BY month_year ORDER BY month_year''',
+            (user_id,)
+        )
+        monthly = cursor.fetchall()
+        cursor.execute(
+            '''SELECT month_year, total_amount, expense_count FROM expense_monthly_rollup
+               WHERE user_id=%s ORDER BY month_year''',
+            (user_id,)
+        )
+        assert cursor.fetchall() == monthly
+
+
+def test_rollups_follow_inserts_and_replacements(rollup_user):
+    db_helper.insert_expense(rollup_user, date(2024, 8, 1), 10, 'Food', '')
+    db_helper.insert_expense(rollup_user, date(2024, 8, 1), 5, 'Food', '')
+    assert_rollups_match_expenses(rollup_user)
+
+    db_helper.replace_user_expenses_for_date(rollup_user, date(2024, 8, 1), [(7, 'Rent', ''), (3, 'Food', '')])
+    assert_rollups_match_expenses(rollup_user)
+    db_helper.replace_user_expenses_for_date(rollup_user, date(2024, 8, 1), [])
+    assert_rollups_match_expenses(rollup_user)
+
+
+def test_rollups_follow_deletes(rollup_user):
+    db_helper.insert_expense(rollup_user, date(2024, 8, 1), 10, 'Food', '')
+    db_helper.insert_expense(rollup_user, date(2024, 8, 20), 4, 'Food', '')
+    db_helper.delete_user_expenses_for_date(rollup_user, date(2024, 8, 1))
+    assert_rollups_match_expenses(rollup_user)
+    db_helper.delete_user_expenses_for_date(rollup_user, date(2024, 8, 20))
+    assert_rollups_match_expenses(rollup_user)
+
+
+def test_rollups_follow_batch_writes(rollup_user):
+    db_helper.write_expense_batch(rollup_user, {
+        date(2024, 8, 1): [(10, 'Food', ''), (2, 'Food', '')],
+        date(2024, 9, 3): [(8, 'Travel', '')],
+    })
+    assert_rollups_match_expenses(rollup_user)
+    # Replaced dates without new rows lose their totals
+    db_helper.write_expense_batch(rollup_user, {date(2024, 9, 4): [(1, 'Food', '')]},
+                                  replace_dates=[date(2024, 8, 1)])
+    assert_rollups_match_expenses(rollup_user)
+
+
+def test_rebuild_matches_incremental_rollups(rollup_user):
+    db_helper.write_expense_batch(rollup_user, {
+        date(2024, 8, 1): [(10, 'Food', '')],
+        date(2024, 8, 2): [(1, 'Rent', '')],
+    })
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute('DELETE FROM expense_daily_rollup WHERE user_id=%s', (rollup_user,))
+    db_helper.rebuild_rollups(rollup_user)
+    assert_rollups_match_expenses(rollup_user)
+
+
+def test_snapshot_keeps_archived_months(rollup_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar_analytics, 'store', columnar_analytics.SnapshotStore(str(tmp_path)))
+    db_helper.write_expense_batch(rollup_user, {
+        date(2022, 3, 1): [(10, 'Food', ''), (4, 'Rent', '')],
+        date(2023, 7, 2): [(1, 'Food', '')],
+        date(2024, 2, 5): [(3, 'Food', '')],
+    })
+    # What archiving a partition does to an old month: its expenses go, its rollups stay
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute('DELETE FROM expenses WHERE user_id=%s AND expense_date < %s', (rollup_user, date(2022, 4, 1)))
+
+    assert columnar_analytics.snapshot_user(rollup_user, today=date(2024, 2, 10)) == 3
+    start_date, end_date = date(2022, 1, 1), date(2024, 12, 31)
+    from_snapshot = columnar_analytics.category_totals(rollup_user, start_date, end_date)
+    from_rollup = db_helper.fetch_user_expense_summary(rollup_user, start_date, end_date)
+    assert sorted((row['category'], row['total']) for row in from_snapshot) == \
+        sorted((row['category'], row['total']) for row in from_rollup)
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def is_connected(self):
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    return ConnectionPool(connect, **kwargs), created
+
+
+def test_connections_are_reused():
+    pool, created = make_pool(size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert len(created) == 1
+
+
+def test_overflow_connections_are_closed_on_release():
+    pool, created = make_pool(size=1, max_overflow=1)
+    first, second = pool.acquire(), pool.acquire()
+    assert pool.stats()['overflow'] == 1
+    pool.release(first)
+    pool.release(second)
+    assert second.closed
+    stats = pool.stats()
+    assert stats['open'] == 1
+    assert stats['overflow_max'] == 1
+
+
+def test_acquire_times_out_when_exhausted():
+    pool, _ = make_pool(size=1, max_overflow=0, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiter_gets_released_connection():
+    pool, _ = make_pool(size=1, max_overflow=0, timeout=2)
+    conn = pool.acquire()
+    threading.Timer(0.05, pool.release, args=(conn,)).start()
+    assert pool.acquire() is conn
+    stats = pool.stats()
+    assert stats['waits'] == 1
+    assert stats['wait_time_max'] > 0
+
+
+def test_unhealthy_connection_is_replaced():
+    pool, created = make_pool(size=1, ping_interval=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.alive = False
+    replacement = pool.acquire()
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()['health_check_failures'] == 1
+
+
+def test_idle_connections_are_evicted():
+    pool, _ = make_pool(size=2, idle_timeout=0.01)
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.02)
+    assert pool.acquire() is not conn
+    assert conn.closed
+    assert pool.stats()['evicted'] == 1
+
+
+def test_discarded_connection_is_not_reused():
+    pool, created = make_pool(size=2)
+    conn = pool.acquire()
+    pool.release(conn, discard=True)
+    assert conn.closed
+    assert pool.acquire() is not conn
+    assert pool.stats()['checked_out'] == 1
@@ -0,0 +1,47 @@
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import export
+
+COLUMNS = ('id', 'expense_date', 'amount', 'category', 'notes')
+BATCHES = [
+    [(1, date(2024, 1, 1), Decimal('10.50'), 'Food', 'lunch')],
+    [(2, date(2024, 1, 2), Decimal('3.00'), 'Other', ''), (3, date(2024, 1, 2), Decimal('7.25'), 'Rent', 'a, "b"')],
+]
+
+
+def test_ndjson_export():
+    lines = b''.join(export.ndjson_chunks(COLUMNS, BATCHES)).decode().splitlines()
+    assert [json.loads(line) for line in lines][0] == {
+        'id': 1, 'expense_date': '2024-01-01', 'amount': 10.5, 'category': 'Food', 'notes': 'lunch'
+    }
+    assert len(lines) == 3
+
+
+def test_csv_export():
+    chunks = list(export.csv_chunks(COLUMNS, BATCHES))
+    rows = list(csv.reader(io.StringIO(b''.join(chunks).decode())))
+    assert rows[0] == list(COLUMNS)
+    assert rows[3] == ['3', '2024-01-02', '7.25', 'Rent', 'a, "b"']
+    assert len(chunks) == 2
+
+
+def test_parquet_export_is_one_row_group_per_batch():
+    pq = pytest.importorskip('pyarrow.parquet')
+    data = b''.join(export.parquet_chunks(COLUMNS, BATCHES))
+    parquet_file = pq.ParquetFile(io.BytesIO(data))
+    assert parquet_file.num_row_groups == 2
+    table = parquet_file.read()
+    assert table.column('amount').to_pylist() == [Decimal('10.50'), Decimal('3.00'), Decimal('7.25')]
+    assert table.column('expense_date').to_pylist()[0] == date(2024, 1, 1)
+
+
+def test_parquet_export_without_rows():
+    pq = pytest.importorskip('pyarrow.parquet')
+    table = pq.read_table(io.BytesIO(b''.join(export.parquet_chunks(COLUMNS, []))))
+    assert table.num_rows == 0
@@ -0,0 +1,24 @@
+from datetime import date
+from decimal import Decimal
+
+import orjson
+
+import SERVER
+from fast_json import FastJSONResponse, dumps
+
+
+def test_decimals_and_dates():
+    row = {'expense_date': date(2024, 8, 15), 'amount': Decimal('10.50'), 'notes': None}
+    assert orjson.loads(dumps(row)) == {'expense_date': '2024-08-15', 'amount': 10.5, 'notes': None}
+
+
+def test_response_renders_with_orjson():
+    response = FastJSONResponse({'total': Decimal('3.10')}, headers={'ETag': '"1-2"'})
+    assert response.body == b'{"total":3.1}'
+    assert response.headers['etag'] == '"1-2"'
+
+
+def test_expenses_schema_documents_the_body_and_304():
+    responses = SERVER.app.openapi()['paths']['/expenses/']['get']['responses']
+    assert responses['200']['content']['application/json']['schema']['items'] == {'$ref': '#/components/schemas/Expense'}
+    assert '304' in responses
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import ingest
+
+
+async def chunked(body: bytes, size: int = 7):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def run_ingest(body: bytes, fmt: str, batch_rows: int = 100):
+    writes = []
+
+    async def write_batch(rows_by_date, replace_dates):
+        writes.append((dict(rows_by_date), set(replace_dates)))
+
+    summary = asyncio.run(ingest.ingest_records(ingest.iter_records(chunked(body), fmt), write_batch, batch_rows))
+    return summary, writes
+
+
+def test_ndjson_rows_are_grouped_by_date():
+    body = (b'{"expense_date": "2024-01-01", "amount": 10, "category": "Food", "notes": "lunch"}\n'
+            b'\n'
+            b'{"expense_date": "2024-01-02", "amount": "5.50", "category": "Rent"}\n'
+            b'{"expense_date": "2024-01-01", "amount": 2, "category": "Other", "notes": null}')
+    summary, writes = run_ingest(body, 'ndjson')
+
+    assert summary['rows'] == 3
+    assert summary['dates'] == {'2024-01-01': 2, '2024-01-02': 1}
+    assert summary['batches'] == 1
+    rows_by_date, replace_dates = writes[0]
+    assert rows_by_date[date(2024, 1, 2)] == [(Decimal('5.50'), 'Rent', '')]
+    assert replace_dates == {date(2024, 1, 1), date(2024, 1, 2)}
+
+
+def test_dates_spanning_batches_are_replaced_once():
+    body = b''.join(
+        b'{"expense_date": "2024-01-01", "amount": %d, "category": "Food"}\n' % i for i in range(5)
+    )
+    summary, writes = run_ingest(body, 'ndjson', batch_rows=2)
+
+    assert summary['batches'] == 3
+    assert summary['dates'] == {'2024-01-01': 5}
+    assert [replace_dates for _, replace_dates in writes] == [{date(2024, 1, 1)}, set(), set()]
+
+
+def test_csv_with_quoted_multiline_notes():
+    body = (b'expense_date,amount,category,notes\r\n'
+            b'2024-03-01,12.5,Food,"dinner,\nwith friends"\r\n'
+            b'2024-03-02,3,Other,\r\n')
+    summary, writes = run_ingest(body, 'csv')
+
+    assert summary['dates'] == {'2024-03-01': 1, '2024-03-02': 1}
+    assert writes[0][0][date(2024, 3, 1)] == [(Decimal('12.5'), 'Food', 'dinner,\nwith friends')]
+
+
+def test_csv_requires_header_columns():
+    with pytest.raises(ingest.IngestError) as e:
+        run_ingest(b'date,amount\n2024-01-01,1\n', 'csv')
+    assert e.value.line_number == 1
+
+
+@pytest.mark.parametrize('line', [
+    b'{"amount": 1, "category": "Food"}',
+    b'{"expense_date": "2024-13-01", "amount": 1, "category": "Food"}',
+    b'{"expense_date": "2024-01-01", "amount": "abc", "category": "Food"}',
+    b'{"expense_date": "2024-01-01", "amount": -1, "category": "Food"}',
+    b'{"expense_date": "2024-01-01", "amount": 1}',
+    b'[1, 2]',
+    b'not json',
+])
+def test_invalid_ndjson_records_report_line_number(line):
+    body = b'{"expense_date": "2024-01-01", "amount": 1, "category": "Food"}\n' + line
+    with pytest.raises(ingest.IngestError) as e:
+        run_ingest(body, 'ndjson')
+    assert e.value.line_number == 2
+
+
+def test_body_format_from_content_type():
+    assert ingest.body_format('application/x-ndjson; charset=utf-8') == 'ndjson'
+    assert ingest.body_format('text/csv') == 'csv'
+    assert ingest.body_format('application/json') is None
@@ -0,0 +1,45 @@
+import json
+import logging
+
+import logging_setup
+from logging_setup import DebugSampler, setup_logger
+
+
+def flush(logfile):
+    # Stop only this test's listener; the application loggers keep theirs
+    _, listener = logging_setup._listeners.pop(str(logfile))
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def test_records_are_written_as_json_by_the_listener(tmp_path):
+    logfile = tmp_path / 'test.log'
+    logger = setup_logger('test_logging_setup.json', str(logfile))
+    logger.info('Fetching expenses for user %s', 7, extra={'duration_ms': 1.5})
+    flush(logfile)
+
+    entry = json.loads(logfile.read_text().splitlines()[0])
+    assert entry['message'] == 'Fetching expenses for user 7'
+    assert (entry['level'], entry['logger'], entry['duration_ms']) == ('INFO', 'test_logging_setup.json', 1.5)
+
+
+def test_repeated_setup_adds_no_handlers(tmp_path):
+    logfile = str(tmp_path / 'test.log')
+    logger = setup_logger('test_logging_setup.repeat', logfile)
+    assert setup_logger('test_logging_setup.repeat', logfile) is logger
+    assert len(logger.handlers) == 1
+    flush(logfile)
+
+
+def test_arguments_are_formatted_on_the_listener_thread():
+    record = logging.makeLogRecord({'msg': 'user %s', 'args': (1,)})
+    handler = logging_setup.LazyQueueHandler(None)
+    assert handler.prepare(record).args == (1,)
+
+
+def test_debug_sampling_keeps_other_levels():
+    sampler = DebugSampler(0.0)
+    assert not sampler.filter(logging.makeLogRecord({'levelno': logging.DEBUG}))
+    assert sampler.filter(logging.makeLogRecord({'levelno': logging.INFO}))
+    assert DebugSampler(1.0).filter(logging.makeLogRecord({'levelno': logging.DEBUG}))
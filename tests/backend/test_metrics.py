@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from prometheus_client import CollectorRegistry
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import metrics
+from cache import TTLCache
+from db_pool import ConnectionPool
+
+
+def sample(name, **labels):
+    return metrics.registry.get_sample_value(name, labels) or 0
+
+
+def test_timed_query_records_latency_and_rows():
+    @metrics.timed_query
+    def fetch_rows():
+        return [{'amount': 1}, {'amount': 2}]
+
+    labels = {'module': __name__, 'function': 'fetch_rows'}
+    before = sample('db_query_rows_sum', **labels)
+    assert fetch_rows() == [{'amount': 1}, {'amount': 2}]
+    assert sample('db_query_duration_seconds_count', **labels) == 1
+    assert sample('db_query_rows_sum', **labels) - before == 2
+
+
+def test_timed_query_async_and_errors():
+    @metrics.timed_query
+    async def failing_fetch():
+        raise RuntimeError('connection lost')
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(failing_fetch())
+    assert sample('db_query_errors_total', module=__name__, function='failing_fetch') == 1
+
+
+def test_timed_query_counts_streamed_batches():
+    @metrics.timed_query
+    def stream():
+        yield [(1,), (2,)]
+        yield [(3,)]
+
+    assert list(stream()) == [[(1,), (2,)], [(3,)]]
+    assert sample('db_query_rows_sum', module=__name__, function='stream') == 3
+
+
+@pytest.mark.parametrize('result, rows', [
+    (None, 0),
+    ({'id': 1}, 1),
+    ({'2024-01-01': [{}, {}], '2024-01-02': []}, 2),
+    (7, 7),
+    (True, None),
+])
+def test_count_rows(result, rows):
+    assert metrics.count_rows(result) == rows
+
+
+def test_stats_collector_exports_existing_stats():
+    read_cache = TTLCache()
+    read_cache.set((1, 'expenses'), [])
+    read_cache.get((1, 'expenses'))
+    read_cache.get((2, 'expenses'))
+    pool = ConnectionPool(lambda: object(), ping=lambda conn: True)
+    pool.acquire()
+
+    registry = CollectorRegistry()
+    registry.register(metrics.StatsCollector(pool_stats=pool.stats, caches={'read': read_cache.stats}))
+    assert registry.get_sample_value('cache_hits_total', {'cache': 'read'}) == 1
+    assert registry.get_sample_value('cache_misses_total', {'cache': 'read'}) == 1
+    assert registry.get_sample_value('db_pool_connections', {'state': 'checked_out'}) == 1
+    assert registry.get_sample_value('db_pool_checkouts_total') == 1
+
+
+def test_requests_are_labelled_by_route_template():
+    def expense(request):
+        return Response('{}', media_type='application/json')
+
+    app = Starlette(routes=[Route('/expenses/{expense_id}', expense)])
+    app.add_middleware(metrics.MetricsMiddleware)
+    client = TestClient(app)
+    client.get('/expenses/1')
+    client.get('/expenses/2')
+    client.get('/unknown')
+
+    assert sample('http_request_duration_seconds_count',
+                  method='GET', route='/expenses/{expense_id}', status='200') == 2
+    assert sample('http_request_duration_seconds_count', method='GET', route='unmatched', status='404') >= 1
@@ -0,0 +1,56 @@
+from datetime import date
+
+import partitions
+
+
+class FakeCursor:
+    def __init__(self, bounds):
+        self.rows = [
+            {'name': partitions.partition_name(partitions.add_months(upper, -1)), 'upper_bound': f"'{upper}'"}
+            for upper in bounds
+        ]
+        self.rows.append({'name': 'p_future', 'upper_bound': 'MAXVALUE'})
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_add_months_crosses_years():
+    assert partitions.add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert partitions.add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+
+
+def test_monthly_partitions():
+    assert partitions.monthly_partitions(date(2024, 12, 15), date(2025, 1, 1)) == [
+        ('p202412', date(2025, 1, 1)),
+        ('p202501', date(2025, 2, 1)),
+    ]
+
+
+def test_ensure_future_partitions_splits_p_future():
+    # Partitions exist up to and including 2025-01
+    cursor = FakeCursor([date(2025, 1, 1), date(2025, 2, 1)])
+    added = partitions.ensure_future_partitions(cursor, months_ahead=2, today=date(2025, 2, 10))
+    assert added == ['p202502', 'p202503', 'p202504']
+    ddl = cursor.statements[-1]
+    assert ddl.startswith('ALTER TABLE expenses REORGANIZE PARTITION p_future INTO')
+    assert "PARTITION p202504 VALUES LESS THAN ('2025-05-01')" in ddl
+    assert ddl.rstrip().endswith('PARTITION p_future VALUES LESS THAN (MAXVALUE)\n)')
+
+
+def test_ensure_future_partitions_is_a_no_op_when_covered():
+    cursor = FakeCursor([date(2025, 3, 1)])
+    assert partitions.ensure_future_partitions(cursor, months_ahead=0, today=date(2025, 2, 10)) == []
+    assert len(cursor.statements) == 1  # only the information_schema lookup
+
+
+def test_archive_partitions_older_than_cutoff():
+    cursor = FakeCursor([date(2023, 1, 1), date(2023, 2, 1), date(2023, 3, 1)])
+    archived = partitions.archive_partitions(cursor, keep_months=24, today=date(2025, 2, 10))
+    assert archived == ['p202212', 'p202301']
+    assert 'ALTER TABLE expenses EXCHANGE PARTITION p202212 WITH TABLE expenses_archive_p202212' in cursor.statements
+    assert cursor.statements[-1] == 'ALTER TABLE expenses DROP PARTITION p202301'
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+import pytest
+
+from password_hashing import HashingBusyError, PasswordHasher
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(rounds=4)
+    hashed = hasher.hash('secret')
+    assert hasher.verify('secret', hashed) == (True, None)
+    assert hasher.verify('wrong', hashed) == (False, None)
+    stats = hasher.stats()
+    assert (stats['hashes'], stats['verifies'], stats['in_flight']) == (1, 2, 0)
+    assert stats['hash_time_max'] > 0
+
+
+def test_changed_rounds_trigger_rehash():
+    old_hash = PasswordHasher(rounds=4).hash('secret')
+    matches, new_hash = PasswordHasher(rounds=5).verify('secret', old_hash)
+    assert matches
+    assert new_hash.startswith('$2b$05$')
+
+
+def test_full_queue_is_rejected():
+    hasher = PasswordHasher(rounds=4, workers=1, queue_limit=1)
+    release = threading.Event()
+    blocked = hasher.submit(release.wait)
+    with pytest.raises(HashingBusyError):
+        hasher.submit(hasher.hash, 'secret')
+    release.set()
+    blocked.result()
+    assert hasher.stats()['rejected'] == 1
+    assert hasher.hash('secret')
+
+
+def test_async_verify():
+    hasher = PasswordHasher(rounds=4)
+    hashed = hasher.hash('secret')
+    assert asyncio.run(hasher.averify('secret', hashed)) == (True, None)
@@ -0,0 +1,40 @@
+from datetime import date
+
+import pytest
+
+import db_helper
+
+DAY = date(2024, 8, 15)
+
+QUERIES = [
+    ('authenticate_user', db_helper.AUTHENTICATE_USER_SQL, ('alice',)),
+    ('fetch_user_expenses', db_helper.FETCH_USER_EXPENSES_SQL, (DAY, 1)),
+    ('fetch_user_expenses_for_dates (range)',
+     *db_helper.expenses_for_dates_query(1, start_date=date(2024, 8, 1), end_date=date(2024, 8, 31))),
+    ('fetch_user_expenses_for_dates (list)', *db_helper.expenses_for_dates_query(1, dates=[DAY, date(2024, 9, 1)])),
+    ('fetch_user_expenses_by_month', db_helper.FETCH_USER_EXPENSES_BY_MONTH_SQL, (1,)),
+    ('fetch_user_expense_summary', db_helper.FETCH_USER_EXPENSE_SUMMARY_SQL, (1, date(2024, 1, 1), DAY)),
+    ('fetch_user_daily_rollup', db_helper.FETCH_USER_DAILY_ROLLUP_SQL, (1, date(2024, 1, 1), DAY)),
+    ('fetch_user_expenses_page (first)', db_helper.FETCH_FIRST_EXPENSES_PAGE_SQL, (1, 100)),
+    ('fetch_user_expenses_page (next)', db_helper.FETCH_NEXT_EXPENSES_PAGE_SQL, (1, DAY, DAY, 10, 100)),
+    ('iter_all_user_expenses', db_helper.EXPORT_USER_EXPENSES_SQL, (1,)),
+    ('iter_user_daily_rollup', db_helper.DAILY_ROLLUP_BEFORE_SQL, (1, DAY)),
+    ('delete_user_expenses_for_date', db_helper.DELETE_USER_EXPENSES_FOR_DATE_SQL, (DAY, 1)),
+] + [
+    (f'rollup refresh #{i}', statement, params)
+    for i, (statement, params) in enumerate(db_helper.rollup_refresh_statements(1, [DAY]))
+]
+
+
+@pytest.mark.parametrize('name, sql, params', QUERIES, ids=[query[0] for query in QUERIES])
+def test_query_uses_an_index(name, sql, params):
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(f'EXPLAIN {sql}', params)
+        plan = cursor.fetchall()
+
+    for row in plan:
+        # Skip the target-table row of INSERT ... SELECT and rows that read no table
+        if row['table'] is None or row['select_type'] == 'INSERT':
+            continue
+        assert row['key'] is not None, f'{name} reads {row["table"]} without an index: {row}'
+        assert row['type'] != 'ALL', f'{name} does a full scan of {row["table"]}: {row}'
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+import pytest
+
+import tokens
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    tokens.token_cache.clear()
+    yield
+    tokens.token_cache.clear()
+
+
+@pytest.mark.parametrize('decode', [tokens.decode_jose, tokens.decode_pyjwt])
+def test_decoders_agree(decode):
+    token = tokens.create_access_token({"sub": "alice", "id": 1}, timedelta(minutes=5))
+    payload = decode(token)
+    assert (payload["sub"], payload["id"]) == ("alice", 1)
+
+
+@pytest.mark.parametrize('decode', [tokens.decode_jose, tokens.decode_pyjwt])
+def test_decoders_reject_bad_tokens(decode):
+    expired = tokens.create_access_token({"sub": "alice", "id": 1}, timedelta(minutes=-1))
+    with pytest.raises(tokens.InvalidTokenError):
+        decode(expired)
+    with pytest.raises(tokens.InvalidTokenError):
+        decode(expired[:-2] + 'xx')
+
+
+def test_verified_tokens_are_cached():
+    calls = []
+
+    def decode(token):
+        calls.append(token)
+        return tokens.decode_jose(token)
+
+    token = tokens.create_access_token({"sub": "alice", "id": 1}, timedelta(minutes=5))
+    assert tokens.verify_token(token, decode) == tokens.verify_token(token, decode)
+    assert len(calls) == 1
+
+
+def test_invalid_tokens_are_not_cached():
+    with pytest.raises(tokens.InvalidTokenError):
+        tokens.verify_token('not-a-token')
+    assert tokens.token_cache.stats()['entries'] == 0
@@ -0,0 +1,79 @@
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import metrics
+import tracing
+
+TRACE_ID = '0af7651916cd43dd8448eb211c80319c'
+TRACEPARENT = f'00-{TRACE_ID}-b7ad6b7169203331-01'
+
+exporter = InMemorySpanExporter()
+
+
+@pytest.fixture(scope='module', autouse=True)
+def provider():
+    # The global provider can only be set once per process; each test starts with an empty exporter
+    sdk_provider = TracerProvider()
+    sdk_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(sdk_provider)
+
+
+@pytest.fixture(autouse=True)
+def spans():
+    exporter.clear()
+    yield exporter.get_finished_spans
+
+
+@metrics.timed_query
+def fetch_expenses(user_id):
+    with tracing.tracer.start_as_current_span('db_helper.checkout'):
+        pass
+    return [{'amount': 1}]
+
+
+def test_server_span_continues_the_callers_trace(spans):
+    def expense(request):
+        fetch_expenses(1)
+        return Response('{}', media_type='application/json')
+
+    app = Starlette(routes=[Route('/expenses/{expense_id}', expense)])
+    app.add_middleware(tracing.TracingMiddleware)
+    TestClient(app).get('/expenses/7', headers={'traceparent': TRACEPARENT})
+
+    checkout, query, server = spans()
+    assert server.name == 'GET /expenses/{expense_id}'
+    assert server.kind == trace.SpanKind.SERVER
+    assert server.attributes['http.response.status_code'] == 200
+    assert {span.context.trace_id for span in (checkout, query, server)} == {int(TRACE_ID, 16)}
+    assert server.parent.span_id == int('b7ad6b7169203331', 16)
+    assert query.parent.span_id == server.context.span_id
+    assert checkout.parent.span_id == query.context.span_id
+
+
+def test_streamed_query_span_ends_with_its_row_count(spans):
+    @metrics.timed_query
+    def stream():
+        yield [(1,), (2,)]
+        yield [(3,)]
+
+    rows = stream()
+    next(rows)
+    assert spans() == ()
+    list(rows)
+    (span,) = spans()
+    assert span.name == f'{__name__}.stream'
+    assert span.attributes['db.rows'] == 3
+
+
+def test_unrouted_requests_share_one_name(spans):
+    app = Starlette(routes=[])
+    app.add_middleware(tracing.TracingMiddleware)
+    TestClient(app).get('/wp-login.php')
+    assert spans()[0].name == f'GET {tracing.UNMATCHED_ROUTE}'
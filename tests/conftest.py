@@ -3,4 +3,6 @@ import sys
 
 project_root =os.path.join(os.path.dirname(__file__), '..')
 sys.path.insert(0, project_root)
+# backend modules import each other as top-level modules (e.g. `from logging_setup import ...`)
+sys.path.insert(0, os.path.join(project_root, 'backend'))
 print(project_root)